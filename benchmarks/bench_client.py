@@ -0,0 +1,150 @@
+"""
+Benchmarks the client's hot paths against the local stand-in server: the
+per-call overhead of `api_handler` and its parts, `image_preprocess` by
+input type, multi-api fan-out and batch chunking.
+
+    PYTHONPATH=. python benchmarks/bench_client.py [--iterations 200] [--filter image]
+                                                   [--json] [--output results.json]
+
+Every case reports ops/sec and p50/p99 latency over `--iterations` timed
+runs, and the peak memory allocated by one run, as traced by `tracemalloc`.
+Cases for numpy arrays are skipped when numpy is not installed.
+"""
+from __future__ import print_function
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import indicoio
+from indicoio import config
+from indicoio.utils import codec
+from indicoio.utils.api import APIRequest, create_url, parse_results
+from indicoio.utils.image import image_preprocess
+from indicoio.utils.standin import StandInServer
+from indicoio.utils.transport import set_transport
+
+
+def cases(directory):
+    """
+    (name, function) for every benchmark case
+    """
+    texts = ["Really enjoyed the movie, the plot and the actors %d." % i for i in range(1000)]
+    request = APIRequest(texts[:100], None, 'sentiment', {'batch': True})
+    response = codec.dumps({'results': [0.5] * 100})
+
+    image = Image.new('RGB', (256, 256), (120, 30, 200))
+    path = os.path.join(directory, 'image.png')
+    image.save(path)
+    with open(path, 'rb') as png:
+        b64 = base64.b64encode(png.read()).decode('ascii')
+
+    yield 'api_handler/create_url', lambda: create_url(
+        config.PUBLIC_API_HOST, 'sentiment', {'batch': True, 'api_key': 'key', 'version': 2}
+    )
+    yield 'api_handler/build_request_100', lambda: APIRequest(texts[:100], None, 'sentiment', {'batch': True})
+    yield 'api_handler/encode_body_100', lambda: request.body(request.chunks[0])
+    yield 'api_handler/parse_response_100', lambda: parse_results(codec.loads(response))
+    yield 'api_handler/single', lambda: indicoio.sentiment(texts[0])
+    yield 'api_handler/batch_100', lambda: indicoio.sentiment(texts[:100])
+
+    yield 'image_preprocess/path', lambda: image_preprocess(path, size=(48, 48))
+    yield 'image_preprocess/pil', lambda: image_preprocess(image, size=(48, 48))
+    yield 'image_preprocess/base64', lambda: image_preprocess(b64)
+    if numpy is not None:
+        floats = numpy.random.RandomState(0).rand(256, 256, 3)
+        uint8 = (floats * 255).astype('uint8')
+        yield 'image_preprocess/ndarray_float', lambda: image_preprocess(floats.copy(), size=(48, 48))
+        yield 'image_preprocess/ndarray_uint8', lambda: image_preprocess(uint8, size=(48, 48))
+
+    apis = ['sentiment', 'language', 'political', 'text_tags']
+    yield 'multi/analyze_text_single', lambda: indicoio.analyze_text(texts[0], apis=apis)
+    yield 'multi/analyze_text_batch_100', lambda: indicoio.analyze_text(texts[:100], apis=apis)
+
+    yield 'chunking/1000_by_50', lambda: indicoio.sentiment(texts, batch_size=50)
+    yield 'chunking/1000_by_50_4_workers', lambda: indicoio.sentiment(texts, batch_size=50, max_workers=4)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def measure(fn, iterations):
+    """
+    ops/sec, p50 and p99 latency in ms, and peak traced memory in KiB
+    """
+    fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'ops_per_sec': len(latencies) / sum(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_kib': peak / 1024.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    parser.add_argument('--output', help="also write results as JSON to this file")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    previous = set_transport(StandInServer())
+    results = {}
+    try:
+        for name, fn in cases(directory):
+            if args.filter in name:
+                results[name] = measure(fn, args.iterations)
+                if not args.json:
+                    print("%-36s %12.1f ops/s %10.3f p50 ms %10.3f p99 ms %10.1f KiB" % (
+                        name, results[name]['ops_per_sec'], results[name]['p50_ms'],
+                        results[name]['p99_ms'], results[name]['peak_kib']
+                    ))
+                    sys.stdout.flush()
+    finally:
+        set_transport(previous)
+        shutil.rmtree(directory)
+
+    report = {
+        'python': sys.version.split()[0],
+        'codec': codec.CODEC.name,
+        'iterations': args.iterations,
+        'results': results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
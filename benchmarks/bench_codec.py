@@ -0,0 +1,64 @@
+"""
+Compares the JSON codecs of `indicoio.utils.codec` on the payload shapes the
+client actually handles: encoding batch request bodies and decoding batch
+responses.
+
+    PYTHONPATH=. python benchmarks/bench_codec.py [--batch 100] [--repeat 20]
+"""
+from __future__ import print_function
+
+import argparse
+import base64
+import os
+import random
+import timeit
+
+from indicoio.utils.api import encode_batch
+from indicoio.utils.codec import CODECS
+
+
+def payloads(batch):
+    """
+    (name, request items, response) for a few representative batch calls
+    """
+    random.seed(0)
+    texts = [" ".join(random.choice(["good", "bad", "movie", "plot", "actor"]) for _ in range(200))
+             for _ in range(batch)]
+    images = [base64.b64encode(os.urandom(48 * 48 * 3)).decode('ascii') for _ in range(batch)]
+    return [
+        ('sentiment', texts, {'results': [random.random() for _ in range(batch)]}),
+        ('keywords', texts, {'results': [
+            dict(("word%d" % i, random.random()) for i in range(10)) for _ in range(batch)
+        ]}),
+        ('image_features', images, {'results': [
+            [random.random() for _ in range(2048)] for _ in range(batch)
+        ]}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print("%-16s %-8s %12s %12s %10s" % ("payload", "codec", "encode ms", "decode ms", "bytes"))
+    for name, items, response in payloads(args.batch):
+        for codec_name in sorted(CODECS):
+            codec = CODECS[codec_name]()
+            encoded_response = codec.dumps(response)
+
+            def encode():
+                return encode_batch([codec.dumps(item) for item in items], {})
+
+            encode_time = min(timeit.repeat(encode, number=1, repeat=args.repeat))
+            decode_time = min(timeit.repeat(
+                lambda: codec.loads(encoded_response), number=1, repeat=args.repeat
+            ))
+            print("%-16s %-8s %12.3f %12.3f %10d" % (
+                name, codec_name, encode_time * 1000, decode_time * 1000, len(encoded_response)
+            ))
+
+
+if __name__ == '__main__':
+    main()
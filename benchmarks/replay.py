@@ -0,0 +1,183 @@
+"""
+Replays recorded traffic through the client, without the network, and
+compares its client-side latency against a stored baseline.
+
+    # record a workload, against the local stand-in server or (--live) the API
+    PYTHONPATH=. python benchmarks/replay.py record traffic.jsonl.gz [--live]
+
+    # replay it and store the timings as the baseline
+    PYTHONPATH=. python benchmarks/replay.py replay traffic.jsonl.gz --save-baseline
+
+    # later: replay again and fail if any api got slower than the baseline
+    PYTHONPATH=. python benchmarks/replay.py replay traffic.jsonl.gz [--json]
+
+Replays answer instantly by default (`--time-scale 0`), so that timings
+measure the client alone: building requests, serialization and parsing.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+
+from PIL import Image
+
+import indicoio
+from indicoio import config
+from indicoio.utils.api import api_handler
+from indicoio.utils.errors import IndicoError
+from indicoio.utils.recording import RecordingTransport, ReplayTransport
+from indicoio.utils.standin import StandInServer
+from indicoio.utils.transport import set_transport, parse_url
+
+
+def workload():
+    """
+    A representative mix of single, batch, multi-api and image calls
+    """
+    texts = ["Really enjoyed the movie, the plot and the actors %d." % i for i in range(200)]
+    images = [Image.new('RGB', (64 + i, 64)) for i in range(20)]
+    for text in texts[:20]:
+        indicoio.sentiment(text)
+    indicoio.sentiment(texts)
+    indicoio.keywords(texts, top_n=5)
+    indicoio.analyze_text(texts[:50], apis=['sentiment', 'language'])
+    indicoio.image_features(images)
+    indicoio.fer(images[:5])
+
+
+def record(args):
+    transport = None if args.live else StandInServer(latency=0.01, latency_per_item=0.0005)
+    recorder = RecordingTransport(args.recording, transport)
+    set_transport(recorder)
+    try:
+        workload()
+    finally:
+        set_transport(None)
+        recorder.close()
+    print("Recorded %s" % args.recording)
+
+
+def recorded_call(exchange):
+    """
+    The `api_handler` call that sent a recorded request, sent as one request
+    """
+    api, batch, method, query = parse_url(exchange['url'])
+    kwargs = json.loads(exchange['request'])
+    data = kwargs.pop('data', None)
+    url_params = {
+        'batch': batch,
+        'method': method,
+        'version': query.get('version'),
+        'apis': query['apis'].split(',') if query.get('apis') else None,
+    }
+    if batch and isinstance(data, list):
+        kwargs.update(batch_size=max(len(data), 1), batch_bytes=len(exchange['request']) * 2)
+    return lambda: api_handler(data, None, api, url_params, retry=False, **kwargs)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def replay(args):
+    transport = ReplayTransport(args.recording, time_scale=args.time_scale)
+    calls = [(parse_url(e['url'])[0], recorded_call(e)) for e in transport.exchanges if 'error' not in e]
+    config.DEDUPLICATE = False
+    timings = defaultdict(list)
+    set_transport(transport)
+    try:
+        for _ in range(args.repeat):
+            for api, call in calls:
+                started = time.time()
+                try:
+                    call()
+                except IndicoError:
+                    pass
+                timings[api].append(time.time() - started)
+    finally:
+        set_transport(None)
+
+    results = dict(
+        (api, {
+            'calls': len(values),
+            'ops_per_sec': len(values) / sum(values) if sum(values) else None,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        })
+        for api, values in timings.items()
+    )
+    report = {'recording': args.recording, 'time_scale': args.time_scale, 'results': results,
+              'misses': transport.misses}
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline:
+            json.dump(report, baseline, indent=2, sort_keys=True)
+        regressions = []
+    else:
+        regressions = compare(report, args.baseline, args.tolerance)
+
+    if args.json:
+        print(json.dumps(dict(report, regressions=regressions), indent=2, sort_keys=True))
+    else:
+        print("%-20s %8s %12s %10s %10s %10s" % ("api", "calls", "ops/sec", "p50 ms", "p99 ms", "vs base"))
+        for api, result in sorted(results.items()):
+            print("%-20s %8d %12.1f %10.3f %10.3f %10s" % (
+                api, result['calls'], result['ops_per_sec'] or 0, result['p50_ms'],
+                result['p99_ms'], "%.2fx" % result['ratio'] if 'ratio' in result else "-"
+            ))
+        for regression in regressions:
+            print("REGRESSION: %s" % regression)
+    return 1 if regressions else 0
+
+
+def compare(report, path, tolerance):
+    """
+    Annotate `report` with the p50 ratio of every api against the baseline
+    at `path`, and return the apis slower than `1 + tolerance` times it
+    """
+    try:
+        with open(path) as baseline:
+            base = json.load(baseline)['results']
+    except (IOError, OSError):
+        return []
+    regressions = []
+    for api, result in report['results'].items():
+        if api in base and base[api]['p50_ms']:
+            result['ratio'] = result['p50_ms'] / base[api]['p50_ms']
+            if result['ratio'] > 1 + tolerance:
+                regressions.append("%s p50 %.3f ms vs %.3f ms baseline" % (
+                    api, result['p50_ms'], base[api]['p50_ms']
+                ))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest='command')
+    recorder = commands.add_parser('record')
+    recorder.add_argument('recording')
+    recorder.add_argument('--live', action='store_true', help="send to the API instead of the stand-in")
+    replayer = commands.add_parser('replay')
+    replayer.add_argument('recording')
+    replayer.add_argument('--baseline', default='benchmarks/baseline.json')
+    replayer.add_argument('--save-baseline', action='store_true')
+    replayer.add_argument('--time-scale', type=float, default=0.0)
+    replayer.add_argument('--repeat', type=int, default=5)
+    replayer.add_argument('--tolerance', type=float, default=0.2)
+    replayer.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args)
+    elif args.command == 'replay':
+        sys.exit(replay(args))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -26,3 +26,4 @@ from indicoio.images.faciallocalization import facial_localization
 from indicoio.images.recognition import image_recognition
 from indicoio.images.filtering import content_filtering
 from indicoio.utils.multi import analyze_image, analyze_text, intersections
+from indicoio.utils.stream import imap
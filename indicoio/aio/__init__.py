@@ -0,0 +1,36 @@
+"""
+Asyncio interface to the indico API
+
+Every function mirrors its counterpart in `indicoio` and returns a coroutine:
+
+    >>> from indicoio import aio
+    >>> await aio.sentiment('Best day ever')
+"""
+import indicoio
+from indicoio.aio.api import coroutine, close, set_concurrency
+from indicoio.aio.custom import Collection, collections
+
+twitter_engagement = coroutine(indicoio.twitter_engagement)
+political = coroutine(indicoio.political)
+posneg = coroutine(indicoio.posneg)
+sentiment = coroutine(indicoio.sentiment)
+sentiment_hq = coroutine(indicoio.sentiment_hq)
+language = coroutine(indicoio.language)
+text_tags = coroutine(indicoio.text_tags)
+keywords = coroutine(indicoio.keywords)
+named_entities = coroutine(indicoio.named_entities)
+people = coroutine(indicoio.people)
+places = coroutine(indicoio.places)
+organizations = coroutine(indicoio.organizations)
+personality = coroutine(indicoio.personality)
+personas = coroutine(indicoio.personas)
+relevance = coroutine(indicoio.relevance)
+fer = coroutine(indicoio.fer)
+facial_features = coroutine(indicoio.facial_features)
+image_features = coroutine(indicoio.image_features)
+facial_localization = coroutine(indicoio.facial_localization)
+image_recognition = coroutine(indicoio.image_recognition)
+content_filtering = coroutine(indicoio.content_filtering)
+analyze_image = coroutine(indicoio.analyze_image)
+analyze_text = coroutine(indicoio.analyze_text)
+intersections = coroutine(indicoio.intersections)
@@ -0,0 +1,337 @@
+"""
+Sends requests built by `indicoio.utils.api` with a non-blocking HTTP client
+"""
+import asyncio
+import weakref
+from functools import partial, wraps
+
+try:
+    import aiohttp
+except ImportError:
+    raise ImportError(
+        "indicoio.aio requires aiohttp, install it with `pip install IndicoIo[aio]`"
+    )
+
+from indicoio import config
+from indicoio.utils.api import (
+    deferred, deduplicated, admit, recorded, check_response, parse_results, check_expired
+)
+from indicoio.utils.compression import encode_body
+from indicoio.utils import codec
+from indicoio.utils.codec import BodyStream
+from indicoio.utils.batch import worker_count, BatchResult, REQUEST_ERRORS, split_range, same_error
+from indicoio.utils import cache as caching
+from indicoio.utils.errors import IndicoError, DeadlineExceededError
+from indicoio.utils.retry import check_deadline
+from indicoio.utils.session import SESSIONS
+from indicoio.utils import transport
+from indicoio.utils.routing import fails_over
+
+RETRY_ON = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class AsyncSessionPool(object):
+    """
+    One `aiohttp.ClientSession` per host and event loop, sized like the sync
+    `SessionPool`, plus a semaphore bounding the number of requests in flight
+    on each loop.
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = {
+                'sessions': {},
+                'semaphore': asyncio.Semaphore(self.concurrency or config.AIO_CONCURRENCY)
+            }
+        return state
+
+    def get(self, host):
+        sessions = self._state()['sessions']
+        session = sessions.get(host)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=SESSIONS.get_pool_size(host))
+            session = sessions[host] = aiohttp.ClientSession(connector=connector)
+        return session
+
+    def semaphore(self):
+        return self._state()['semaphore']
+
+    def configure(self, concurrency):
+        self.concurrency = concurrency
+        for state in self._loops.values():
+            state['semaphore'] = asyncio.Semaphore(concurrency)
+
+    async def close(self):
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state:
+            for session in state['sessions'].values():
+                await session.close()
+
+
+SESSIONS_AIO = AsyncSessionPool()
+
+
+def set_concurrency(concurrency):
+    """
+    Set the maximum number of requests in flight at once, per event loop.
+    """
+    SESSIONS_AIO.configure(concurrency)
+
+
+async def close():
+    """
+    Close the sessions opened on the running event loop.
+    """
+    await SESSIONS_AIO.close()
+
+
+async def send_request(request, chunk):
+    body = request.body(chunk)
+    data, headers = encode_body(body)
+    upload = iterate(data) if isinstance(data, BodyStream) else data
+    delay, timeout = admit(request, chunk)
+    if delay:
+        await asyncio.sleep(delay)
+    options = {} if timeout is None else {'timeout': aiohttp.ClientTimeout(total=timeout)}
+    async with SESSIONS_AIO.semaphore():
+        custom = transport.TRANSPORT
+        if custom is not None:
+            with recorded(request, chunk, body, data):
+                response = await post_transport(custom, request.url, data, headers, timeout)
+                check_response(request, response.status_code, response.headers)
+                return parse_results(codec.loads(response.content), response.status_code)
+
+        session = SESSIONS_AIO.get(request.host)
+        with recorded(request, chunk, body, data):
+            async with session.post(
+                request.url, data=upload, headers=headers, ssl=False, **options
+            ) as response:
+                check_response(request, response.status, response.headers)
+                return parse_results(codec.loads(await response.read()), response.status)
+
+
+async def post_transport(custom, url, data, headers, timeout):
+    """
+    Send a request through a `Transport`, without blocking the event loop
+    """
+    post_async = getattr(custom, 'post_async', None)
+    if post_async is not None:
+        return await post_async(url, data, headers, timeout=timeout)
+    return await asyncio.get_running_loop().run_in_executor(
+        None, partial(custom.post, url, data, headers, timeout=timeout)
+    )
+
+
+async def iterate(pieces):
+    """
+    Async iterable over a streamed request body, as aiohttp expects
+    """
+    for piece in pieces:
+        yield piece
+
+
+async def call_with_retry(policy, fn, request, chunk):
+    """
+    Async counterpart of `RetryPolicy.call`, also retrying aiohttp connection errors
+    """
+    attempt = 1
+    while True:
+        try:
+            return await fn(request, chunk)
+        except policy.retry_on + RETRY_ON as error:
+            delay = policy.next_delay(attempt, error)
+            if delay is None:
+                raise
+            check_deadline(request.deadline, delay, error)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def call_hedged(policy, request, chunk):
+    """
+    Async counterpart of `HedgePolicy.call`, cancelling the losing request
+    """
+    delay = policy.delay(request.host, request.api, chunk)
+    primary = asyncio.ensure_future(send_request(request, chunk))
+    if delay is None:
+        return await primary
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done or not policy.allow():
+        return await primary
+
+    hedge = asyncio.ensure_future(send_request(request, chunk))
+    pending = {primary, hedge}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        policy.won()
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_routed(pool, send, request, chunk):
+    """
+    Async counterpart of `EndpointPool.call`
+    """
+    error = None
+    for endpoint in pool.candidates(request.api):
+        try:
+            return await send(request.routed_to(endpoint), chunk)
+        except Exception as failure:
+            if not fails_over(failure):
+                raise
+            error = failure
+    raise error
+
+
+async def send(request):
+    """
+    Send every chunk of an `APIRequest`, at most `request.max_workers` at a
+    time, and return the merged result. When a cache is set, only the items
+    missing from it are sent.
+    """
+    if request.stream:
+        raise IndicoError("stream=True is not supported by indicoio.aio")
+    cache = caching.CACHE
+    if cache is None or not request.cache_prefix():
+        return await execute(request)
+    lookup = caching.Lookup(cache, request)
+    if lookup.missing is None:
+        return lookup.merge()
+    try:
+        fetched = await execute(lookup.missing)
+    except DeadlineExceededError as error:
+        lookup.merge_expired(error)
+        raise
+    return lookup.merge(fetched)
+
+
+async def execute(request):
+    """
+    Async counterpart of `indicoio.utils.api.execute`
+    """
+    request, fan_out = deduplicated(request)
+    try:
+        return fan_out(await send_chunks(request))
+    except DeadlineExceededError as error:
+        if error.results is not None:
+            error.results = fan_out(error.results)
+        raise
+
+
+async def send_chunks(request):
+    limit = asyncio.Semaphore(worker_count(request.max_workers, len(request.chunks)))
+    policy = request.retry_policy()
+    hedge = request.hedge_policy()
+    send = partial(call_hedged, hedge) if hedge else send_request
+    if request.pool is not None:
+        send = partial(call_routed, request.pool, send)
+
+    async def send_chunk(chunk):
+        async with limit:
+            return await call_with_retry(policy, send, request, chunk)
+
+    if not request.isolates_errors():
+        results = await gather(expiring(send_chunk, chunk) for chunk in request.chunks)
+        return request.finalize(check_expired(request, results))
+
+    outcomes = await gather(
+        expiring(partial(isolate, send_chunk), chunk) for chunk in request.chunks
+    )
+    check_expired(request, [
+        outcome if isinstance(outcome, DeadlineExceededError) else outcome[0]
+        for outcome in outcomes
+    ])
+    return BatchResult(
+        request.finalize([results for results, _ in outcomes]),
+        extra_requests=sum(extra for _, extra in outcomes)
+    )
+
+
+async def expiring(send_chunk, chunk):
+    """
+    Async counterpart of `indicoio.utils.api.expiring`
+    """
+    try:
+        return await send_chunk(chunk)
+    except DeadlineExceededError as error:
+        return error
+
+
+async def gather(coroutines):
+    """
+    Run `coroutines` concurrently and return their results in order. If any
+    of them fails, the others are cancelled.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def isolate(send_chunk, chunk, error=None):
+    """
+    Async counterpart of `indicoio.utils.batch.isolate`
+    """
+    if error is None:
+        try:
+            return await send_chunk(chunk), 0
+        except REQUEST_ERRORS:
+            raise
+        except IndicoError as failure:
+            error = failure
+
+    start, stop = chunk
+    if stop - start <= 1:
+        return [error] * (stop - start), 0
+    halves = split_range(chunk)
+    outcomes = []
+    for half in halves:
+        try:
+            outcomes.append((await send_chunk(half), None))
+        except REQUEST_ERRORS:
+            raise
+        except IndicoError as failure:
+            outcomes.append((None, failure))
+
+    extra = len(halves)
+    if same_error(outcomes[0][1], outcomes[1][1]):
+        return [error] * (stop - start), extra
+    results = []
+    for half, (half_results, half_error) in zip(halves, outcomes):
+        if half_error is not None:
+            half_results, half_extra = await isolate(send_chunk, half, half_error)
+            extra += half_extra
+        results.extend(half_results)
+    return results, extra
+
+
+def coroutine(fn):
+    """
+    Turn an `indicoio` api function into a coroutine function. `fn` runs as
+    usual to preprocess its input and build the request, which is then sent
+    without blocking the event loop.
+    """
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with deferred():
+            request = fn(*args, **kwargs)
+        return await send(request)
+    return wrapper
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from indicoio.custom import custom
+from indicoio.aio.api import coroutine
+from indicoio.utils.retry import check_deadline
+
+
+class Collection(custom.Collection):
+
+    add_data = coroutine(custom.Collection.add_data)
+    train = coroutine(custom.Collection.train)
+    predict = coroutine(custom.Collection.predict)
+    clear = coroutine(custom.Collection.clear)
+    remove_example = coroutine(custom.Collection.remove_example)
+
+    async def wait(self, interval=1, deadline=None, **kwargs):
+        """
+        Wait until the collection's model is completed training, see
+        `indicoio.custom.Collection.wait`
+        """
+        expires = None if deadline is None else time.time() + deadline
+        while True:
+            if expires is not None:
+                kwargs['deadline'] = expires - time.time()
+            if (await self.info(**kwargs)).get('status') == "ready":
+                return
+            check_deadline(expires, interval)
+            await asyncio.sleep(interval)
+
+    async def info(self, **kwargs):
+        """
+        Return the current state of the model associated with a given collection
+        """
+        return (await collections(**kwargs)).get(self.collection)
+
+
+collections = coroutine(custom.collections)
@@ -28,6 +28,7 @@ class Settings(configparser.ConfigParser):
 
         self.auth_settings = self.get_section('auth')
         self.private_cloud_settings = self.get_section('private_cloud')
+        self.connection_settings = self.get_section('connection')
 
     def get_section(self, section):
         """
@@ -39,10 +40,20 @@ class Settings(configparser.ConfigParser):
             return {}
 
     def cloud(self):
-        return (
+        endpoints = self.endpoints()
+        if not endpoints or endpoints[0][0] == PUBLIC_ENDPOINT:
+            return None
+        return endpoints[0][0]
+
+    def endpoints(self):
+        """
+        Weighted endpoints, given as a comma separated list of `name` or
+        `name=weight`, see `indicoio.utils.routing`
+        """
+        return parse_endpoints(
             os.getenv("INDICO_CLOUD") or
             self.private_cloud_settings.get('cloud') or
-            None
+            ""
         )
 
     def api_key(self):
@@ -52,6 +63,48 @@ class Settings(configparser.ConfigParser):
             None
         )
 
+    def pool_size(self):
+        return int(
+            os.getenv("INDICO_POOL_SIZE") or
+            self.connection_settings.get('pool_size') or
+            DEFAULT_POOL_SIZE
+        )
+
+    def timeout(self):
+        timeout = (
+            os.getenv("INDICO_TIMEOUT") or
+            self.connection_settings.get('timeout')
+        )
+        return float(timeout) if timeout else None
+
+    def gzip_min_bytes(self):
+        min_bytes = (
+            os.getenv("INDICO_GZIP_MIN_BYTES") or
+            self.connection_settings.get('gzip_min_bytes')
+        )
+        return int(min_bytes) if min_bytes else None
+
+    def gzip_level(self):
+        return int(
+            os.getenv("INDICO_GZIP_LEVEL") or
+            self.connection_settings.get('gzip_level') or
+            DEFAULT_GZIP_LEVEL
+        )
+
+def parse_endpoints(value):
+    """
+    Parse "east=3, west=1, public=0" into [("east", 3.0), ("west", 1.0), ("public", 0.0)]
+    """
+    endpoints = []
+    for entry in value.split(","):
+        name, _, weight = entry.strip().partition("=")
+        if name:
+            endpoints.append((name.strip(), float(weight) if weight.strip() else 1.0))
+    return endpoints
+
+# Endpoint name standing for `PUBLIC_API_HOST` in a list of endpoints
+PUBLIC_ENDPOINT = 'public'
+
 TEXT_APIS = [
     'text_tags',
     'political',
@@ -90,6 +143,46 @@ OTHER_APIS = [
 
 API_NAMES = IMAGE_APIS + TEXT_APIS + OTHER_APIS
 
+DEFAULT_POOL_SIZE = 10
+
+# zlib compression level of gzipped request bodies, see `indicoio.utils.compression`
+DEFAULT_GZIP_LEVEL = 6
+
+# Number of chunks of a single batch call sent concurrently, unless
+# `max_workers` is passed explicitly
+MAX_WORKERS = 1
+
+# Send repeated inputs of a batch only once, and share one request between
+# concurrent identical calls
+DEDUPLICATE = True
+
+# Response statuses for which a request is retried, see `indicoio.utils.retry`
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Response statuses rejecting a request as a whole rather than any of its
+# inputs, raised as `RequestError` and never bisected by `isolate_errors`
+REQUEST_ERROR_STATUSES = (401, 403, 404)
+
+# Bytes read from the socket at a time when streaming results, see `stream=True`
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of requests in flight at once through `indicoio.aio`, per event loop
+AIO_CONCURRENCY = 100
+
+# Upper bounds on a single batch request, keyed by server api name.
+# Larger batches are transparently split into several requests.
+BATCH_LIMITS = {
+    'default': {'size': 1000, 'bytes': 4 * 1024 ** 2},
+    'apis/multiapi': {'size': 200, 'bytes': 4 * 1024 ** 2},
+    'custom': {'size': 500, 'bytes': 8 * 1024 ** 2},
+    'fer': {'size': 500, 'bytes': 8 * 1024 ** 2},
+    'facialfeatures': {'size': 500, 'bytes': 8 * 1024 ** 2},
+    'faciallocalization': {'size': 100, 'bytes': 8 * 1024 ** 2},
+    'imagefeatures': {'size': 100, 'bytes': 8 * 1024 ** 2},
+    'imagerecognition': {'size': 100, 'bytes': 8 * 1024 ** 2},
+    'contentfiltering': {'size': 100, 'bytes': 8 * 1024 ** 2},
+}
+
 SETTINGS = Settings(files=[
     os.path.expanduser("~/.indicorc"),
     os.path.join(os.getcwd(), '.indicorc')
@@ -97,5 +190,10 @@ SETTINGS = Settings(files=[
 
 api_key = SETTINGS.api_key()
 cloud = SETTINGS.cloud()
+endpoints = SETTINGS.endpoints()
+pool_size = SETTINGS.pool_size()
+timeout = SETTINGS.timeout()
+gzip_min_bytes = SETTINGS.gzip_min_bytes()
+gzip_level = SETTINGS.gzip_level()
 PUBLIC_API_HOST = 'apiv2.indico.io'
 url_protocol = "https:"
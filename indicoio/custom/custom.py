@@ -3,6 +3,7 @@ import time
 from indicoio.utils.api import api_handler
 from indicoio.utils.decorators import detect_batch
 from indicoio.utils.image import image_preprocess
+from indicoio.utils.retry import check_deadline
 
 
 class Collection(object):
@@ -174,18 +175,26 @@ class Collection(object):
         url_params = {"batch": batch, "api_key": api_key, "version": version, 'method': 'remove_example'}
         return api_handler(data, cloud=cloud, api="custom", url_params=url_params, private=True, **kwargs)
 
-    def wait(self, interval=1):
+    def wait(self, interval=1, deadline=None, **kwargs):
         """
-        Block until the collection's model is completed training
+        Block until the collection's model is completed training. With a
+        `deadline`, in seconds, give up with `DeadlineExceededError` rather
+        than wait past it.
         """
-        while self.info().get('status') != "ready":
+        expires = None if deadline is None else time.time() + deadline
+        while True:
+            if expires is not None:
+                kwargs['deadline'] = expires - time.time()
+            if self.info(**kwargs).get('status') == "ready":
+                return
+            check_deadline(expires, interval)
             time.sleep(interval)
 
-    def info(self):
+    def info(self, **kwargs):
         """
         Return the current state of the model associated with a given collection
         """
-        return collections().get(self.collection)
+        return collections(**kwargs).get(self.collection)
 
 
 def collections(cloud=None, api_key=None, version=None, **kwargs):
@@ -27,7 +27,9 @@ def facial_features(image, cloud=None, batch=False, api_key=None, version=None,
     :type image: list of lists
     :rtype: List containing feature responses
     """
-    image = image_preprocess(image, batch=batch, size=None if kwargs.get("detect") else (48, 48))
+    image = image_preprocess(image, batch=batch, lazy=kwargs.get("stream_body", False),
+        size=None if kwargs.get("detect") else (48, 48)
+    )
     url_params = {"batch": batch, "api_key": api_key, "version": version}
     return api_handler(image, cloud=cloud, api="facialfeatures", url_params=url_params, **kwargs)
 
@@ -63,6 +65,8 @@ def image_features(image, cloud=None, batch=False, api_key=None, version=3, **kw
     :type image: numpy.ndarray
     :rtype: List containing features
     """
-    image = image_preprocess(image, batch=batch, size=144, min_axis=True)
+    image = image_preprocess(
+        image, batch=batch, size=144, min_axis=True, lazy=kwargs.get("stream_body", False)
+    )
     url_params = {"batch": batch, "api_key": api_key, "version": version}
     return api_handler(image, cloud=cloud, api="imagefeatures", url_params=url_params, **kwargs)
@@ -28,7 +28,7 @@ def fer(image, cloud=None, batch=False, api_key=None, version=None, **kwargs):
     :rtype: Dictionary containing emotion probability pairs
     """
 
-    image = image_preprocess(image, batch=batch,
+    image = image_preprocess(image, batch=batch, lazy=kwargs.get("stream_body", False),
         size=None if kwargs.get("detect") else (48, 48)
     )
 
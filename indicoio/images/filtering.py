@@ -24,6 +24,8 @@ def content_filtering(image, cloud=None, batch=False, api_key=None, version=None
     :type image: list of lists
     :rtype: float of nsfwness
     """
-    image = image_preprocess(image, batch=batch, size=128, min_axis=True)
+    image = image_preprocess(
+        image, batch=batch, size=128, min_axis=True, lazy=kwargs.get("stream_body", False)
+    )
     url_params = {"batch": batch, "api_key": api_key, "version": version}
     return api_handler(image, cloud=cloud, api="contentfiltering", url_params=url_params, **kwargs)
@@ -0,0 +1,170 @@
+"""
+Tunes chunk size and concurrency per endpoint from observed latency and errors
+"""
+import threading
+from collections import deque
+
+from indicoio.utils.errors import is_overload
+from indicoio.utils.stats import STATS
+
+
+class AdaptiveController(object):
+    """
+    Picks the chunk size and number of concurrent chunks of batch calls,
+    separately for every (host, api), aiming for chunks that complete in
+    about `target_latency` seconds.
+
+    While chunks complete within the target, the chunk size grows by at least
+    `increase` items, and up to doubling towards the size the observed
+    per-item latency predicts would meet the target; one more worker is added
+    after as many successes in a row as there are workers. A slow chunk
+    shrinks the chunk size in proportion to how far it overshot, and an
+    overload error (a retryable status, connection error or timeout) scales
+    the chunk size by `decrease` and halves the workers.
+
+    Chunk sizes stay within [`min_size`, `max_size`] and the per-api limits
+    of `config.BATCH_LIMITS`; workers stay within [`min_workers`, `max_workers`].
+    Per-call `batch_size` and `max_workers` arguments take precedence.
+
+    Example usage:
+
+    .. code-block:: python
+
+       >>> from indicoio.utils.adaptive import AdaptiveController, set_controller
+       >>> set_controller(AdaptiveController(target_latency=5))
+       >>> indicoio.image_features(images)
+       >>> set_controller(None).decisions()
+    """
+
+    def __init__(self, target_latency=2.0, min_size=1, max_size=1000, initial_size=32,
+                 min_workers=1, max_workers=8, initial_workers=1, increase=8,
+                 decrease=0.5, smoothing=0.2, history=100):
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.initial_size = initial_size
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.initial_workers = initial_workers
+        self.increase = increase
+        self.decrease = decrease
+        self.smoothing = smoothing
+        self.history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _state(self, host, api):
+        state = self._endpoints.get((host, api))
+        if state is None:
+            state = self._endpoints[(host, api)] = {
+                'batch_size': self._clamp(self.initial_size, self.min_size, self.max_size),
+                'max_workers': self._clamp(self.initial_workers, self.min_workers, self.max_workers),
+                'item_latency': None,
+                'item_bytes': None,
+                'error_rate': 0.0,
+                'successes': 0,
+                'reason': 'initial'
+            }
+        return state
+
+    def _clamp(self, value, low, high):
+        return int(max(low, min(high, value)))
+
+    def _average(self, previous, value):
+        if previous is None:
+            return value
+        return previous + self.smoothing * (value - previous)
+
+    def batch_size(self, host, api):
+        with self._lock:
+            return self._state(host, api)['batch_size']
+
+    def workers(self, host, api):
+        with self._lock:
+            return self._state(host, api)['max_workers']
+
+    def observe(self, host, api, items, nbytes, latency, error=None, batch=True):
+        """
+        Adjust the decisions for (host, api) after a chunk of `items` items
+        and `nbytes` bytes completed in `latency` seconds or failed with `error`.
+        Single item calls say nothing about chunk size and are ignored.
+        """
+        if not batch or not items:
+            return
+        overloaded = is_overload(error)
+        if error is not None and not overloaded:
+            return
+
+        with self._lock:
+            state = self._state(host, api)
+            size, workers = state['batch_size'], state['max_workers']
+            state['error_rate'] = self._average(state['error_rate'], 1.0 if overloaded else 0.0)
+
+            if overloaded:
+                size = size * self.decrease
+                workers = workers // 2
+                state['successes'] = 0
+                reason = 'overload: %s' % error.__class__.__name__
+            else:
+                state['item_latency'] = self._average(state['item_latency'], latency / items)
+                state['item_bytes'] = self._average(state['item_bytes'], float(nbytes) / items)
+                if latency > self.target_latency:
+                    size = size * max(self.decrease, self.target_latency / latency)
+                    state['successes'] = 0
+                    reason = 'latency %.2fs over target' % latency
+                else:
+                    if items >= size:
+                        estimate = self.target_latency / max(state['item_latency'], 1e-6)
+                        size = max(size + self.increase, min(2 * size, estimate))
+                    state['successes'] += 1
+                    if state['successes'] >= workers:
+                        workers += 1
+                        state['successes'] = 0
+                    reason = 'latency %.2fs within target' % latency
+
+            size = self._clamp(size, self.min_size, self.max_size)
+            workers = self._clamp(workers, self.min_workers, self.max_workers)
+            if (size, workers) != (state['batch_size'], state['max_workers']):
+                state['batch_size'], state['max_workers'] = size, workers
+                state['reason'] = reason
+                self.history.append({
+                    'endpoint': "%s/%s" % (host, api),
+                    'batch_size': size,
+                    'max_workers': workers,
+                    'reason': reason
+                })
+
+    def __call__(self, *args, **kwargs):
+        self.observe(*args, **kwargs)
+
+    def decisions(self):
+        """
+        Current chunk size and workers of every endpoint, with the
+        measurements and the reason behind the last change
+        """
+        with self._lock:
+            return dict(
+                ("%s/%s" % (host, api), dict(
+                    (name, value) for name, value in state.items() if name != 'successes'
+                ))
+                for (host, api), state in self._endpoints.items()
+            )
+
+
+CONTROLLER = None
+
+
+def set_controller(controller):
+    """
+    Size and parallelize batch calls with `controller`, an
+    `AdaptiveController`, or pass None to go back to the static limits.
+    Returns the previous controller.
+    """
+    global CONTROLLER
+    previous = CONTROLLER
+    if previous is not None:
+        STATS.unsubscribe(previous)
+    CONTROLLER = controller
+    if controller is not None:
+        STATS.subscribe(controller)
+    return previous
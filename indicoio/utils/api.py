@@ -2,43 +2,648 @@
 Handles making requests to the IndicoApi Server
 """
 
+import copy
+import hashlib
 import json
-import requests
+import threading
+import time
 import warnings
+from contextlib import contextmanager
+from functools import partial
+from email.utils import parsedate_tz, mktime_tz
+
+import requests
 
-from indicoio.utils.errors import IndicoError
-from indicoio import JSON_HEADERS
+from indicoio.utils.errors import (
+    IndicoError, RetryableError, RequestError, UnsupportedAPIError, DeadlineExceededError
+)
+from indicoio.utils.session import get_session
+from indicoio.utils.batch import (
+    batch_limits, chunk_ranges, deduplicate, dispatch, isolate, merge_results, BatchResult,
+    LazyItems
+)
+from indicoio.utils import coalesce
+from indicoio.utils import cache as caching
+from indicoio.utils import retry
+from indicoio.utils import adaptive
+from indicoio.utils import ratelimit
+from indicoio.utils import breaker as circuits
+from indicoio.utils import hedge as hedging
+from indicoio.utils import routing
+from indicoio.utils import transport
+from indicoio.utils.compression import encode_body
+from indicoio.utils import codec
+from indicoio.utils.codec import BodyStream, body_size
+from indicoio.utils.stats import STATS
 from indicoio import config
 
+_DEFERRED = threading.local()
+
+
+class APIRequest(object):
+    """
+    A request to a single api, built from the arguments of `api_handler`: the
+    target host and url, and the data to send, split into chunks for batch
+    calls. Both the sync client and `indicoio.aio` send these, so the two
+    always build identical requests.
+    """
+
+    def __init__(self, arg, cloud, api, url_params=None, **kwargs):
+        url_params = url_params or {}
+        self.batch_size = kwargs.pop('batch_size', None)
+        self.batch_bytes = kwargs.pop('batch_bytes', None)
+        self.max_workers = kwargs.pop('max_workers', None)
+        self.retry = kwargs.pop('retry', None)
+        self.isolate_errors = kwargs.pop('isolate_errors', False)
+        self.stream = kwargs.pop('stream', False)
+        self.stream_body = kwargs.pop('stream_body', False)
+        self.hedge = kwargs.pop('hedge', None)
+        self.timeout = kwargs.pop('timeout', None)
+        deadline = kwargs.pop('deadline', None)
+        self.deadline = None if deadline is None else time.time() + deadline
+        if type(arg) == bytes:
+            arg = arg.decode('utf-8')
+        if type(arg) == list:
+            arg = [a.decode('utf-8') if type(a) == bytes else a for a in arg]
+
+        self.api = api
+        self.url_params = url_params
+        self.pool = None if cloud or not self.is_routable() else routing.get_pool()
+        if self.pool is not None:
+            endpoint = self.pool.primary()
+            self.cloud, self.host = endpoint.cloud, endpoint.host
+        else:
+            self.cloud = cloud or config.cloud
+            self.host = "%s.indico.domains" % self.cloud if self.cloud else config.PUBLIC_API_HOST
+        self.params = dict(kwargs, **url_params)
+        self.url = create_url(self.host, api, self.params)
+        self.api_key = self.params.get('api_key') or config.api_key
+        self.kwargs = kwargs
+        self.callbacks = []
+
+        if is_chunked(arg, url_params):
+            if self.stream_body:
+                # items are encoded as the body is sent, so chunks are
+                # bounded by item count only
+                self.data = arg
+                self.chunks = chunk_ranges([0] * len(arg), *self.chunk_limits())
+            else:
+                self.data = [codec.dumps(a) for a in arg]
+                self.chunks = chunk_ranges(list(map(len, self.data)), *self.chunk_limits())
+            controller = adaptive.CONTROLLER
+            if self.max_workers is None and controller is not None:
+                self.max_workers = controller.workers(self.host, api)
+        else:
+            self.data = arg
+            self.chunks = [None]
+
+    def body(self, chunk):
+        """
+        JSON request body, as bytes, for one of `self.chunks`. With
+        `stream_body=True` the body of a batch chunk is a `BodyStream` that
+        encodes every item only as it is sent.
+        """
+        if chunk is None:
+            data = {'data': self.data}
+            data.update(**self.kwargs)
+            return codec.dumps(data)
+        start, stop = chunk
+        if self.stream_body:
+            return BodyStream(stream_batch(self.data, start, stop, self.kwargs))
+        return encode_batch(self.data[start:stop], self.kwargs)
+
+    def batched(self, items):
+        """
+        The batch request for `items`, with the same api, version, arguments
+        and retry and hedge options
+        """
+        url_params = dict(self.url_params, batch=True)
+        cloud = self.cloud if self.pool is None else None
+        return APIRequest(
+            items, cloud, self.api, url_params, isolate_errors=True,
+            retry=self.retry, hedge=self.hedge, **self.kwargs
+        )
+
+    def select(self, indices):
+        """
+        A copy of this batch request restricted to the items at `indices`
+        """
+        request = copy.copy(self)
+        request.data = [self.data[idx] for idx in indices]
+        request.chunks = chunk_ranges(list(map(len, request.data)), *self.chunk_limits())
+        return request
+
+    def chunk_limits(self):
+        """
+        Max items and bytes per chunk, as decided by the adaptive controller
+        when one is set and no `batch_size` was passed
+        """
+        max_items, max_bytes = batch_limits(self.api, self.batch_size, self.batch_bytes)
+        controller = adaptive.CONTROLLER
+        if controller is not None and not self.batch_size:
+            max_items = min(max_items, controller.batch_size(self.host, self.api))
+        return max_items, max_bytes
+
+    def is_prediction(self):
+        """
+        Whether every item of this request gets its own, independent result
+        """
+        return not (self.url_params.get('method') or self.api.startswith('apis/'))
+
+    def is_routable(self):
+        """
+        Whether this request may be sent to any of the configured endpoints.
+        Custom collections only exist on the deployment they were created on.
+        """
+        return self.is_prediction() and self.api != 'custom'
+
+    def routed_to(self, endpoint):
+        """
+        A copy of this request sent to `endpoint`, a `routing.Endpoint`
+        """
+        request = copy.copy(self)
+        request.cloud, request.host = endpoint.cloud, endpoint.host
+        request.url = create_url(request.host, self.api, self.params)
+        return request
+
+    def is_idempotent(self):
+        """
+        Whether this request can safely be sent again. Custom collection
+        methods such as `add_data` or `train` modify the collection.
+        """
+        return self.url_params.get('method') in (None, 'collections')
+
+    def isolates_errors(self):
+        return self.isolate_errors and self.chunks != [None] and self.is_prediction()
+
+    def retry_policy(self):
+        if not self.is_idempotent():
+            return retry.NO_RETRY
+        return retry.get_policy(self.retry)
+
+    def request_timeout(self, delay=0):
+        """
+        Timeout of a single HTTP request sent after waiting `delay` seconds:
+        `timeout`, or `config.timeout`, capped by the time left before the
+        deadline. Raises `DeadlineExceededError` if the deadline would pass
+        first.
+        """
+        retry.check_deadline(self.deadline, delay)
+        timeout = self.timeout if self.timeout is not None else config.timeout
+        if self.deadline is None:
+            return timeout
+        left = self.deadline - time.time() - delay
+        return left if timeout is None else min(timeout, left)
+
+    def hedge_policy(self):
+        if not (self.is_prediction() and self.is_idempotent()):
+            return None
+        policy = hedging.get_policy(self.hedge)
+        if policy is not None and self.chunks != [None] and not policy.batches:
+            return None
+        return policy
+
+    def coalesce_key(self):
+        """
+        Key under which this single-item request may be grouped with others
+        sent with the same retry and hedge options, or None if it cannot be
+        sent as part of a batch.
+        """
+        if (self.chunks != [None] or self.url_params.get('batch') or not self.is_prediction() or
+                self.timeout is not None or self.deadline is not None):
+            return None
+        return (self.host, self.api, self.url, json.dumps(self.kwargs, sort_keys=True),
+                self.retry, self.hedge)
+
+    def flight_key(self):
+        """
+        Key identifying identical prediction requests: same url, arguments,
+        per-call options and data. Calls with a timeout or deadline are never
+        shared, as they may give up before the others.
+        """
+        if (not self.is_prediction() or self.stream_body or
+                self.timeout is not None or self.deadline is not None):
+            return None
+        digest = hashlib.sha1()
+        for item in self.data if self.chunks != [None] else [codec.dumps(self.data)]:
+            digest.update(item)
+            digest.update(b'\n')
+        return (self.url, json.dumps(self.kwargs, sort_keys=True), self.options(), digest.hexdigest())
+
+    def options(self):
+        """
+        The per-call options that change how this request is sent or what
+        it returns
+        """
+        return (self.isolate_errors, self.retry, self.hedge, self.max_workers,
+                self.batch_size, self.batch_bytes)
+
+    def cache_prefix(self):
+        """
+        The part of the cache key shared by every item of this request: host,
+        api, version and arguments, but not the api key. Custom collections
+        change as they are trained, so their predictions are never cached.
+        """
+        if not self.is_prediction() or self.api == 'custom' or self.stream_body:
+            return None
+        version = self.url_params.get('version') or self.url_params.get('v')
+        return json.dumps([self.host, self.api, version, self.kwargs], sort_keys=True)
+
+    def then(self, callback):
+        """
+        Register a function applied to the final result of this request
+        """
+        self.callbacks.append(callback)
+        return self
+
+    def finalize(self, results):
+        """
+        Merge the results of every chunk, in order, and apply callbacks
+        """
+        result = merge_results(results)
+        for callback in self.callbacks:
+            result = callback(result)
+        return result
+
+
 def api_handler(arg, cloud, api, url_params=None, **kwargs):
     """
     Sends finalized request data to ML server and receives response.
+
+    Batch requests are split into chunks bounded by item count and serialized
+    size (see `config.BATCH_LIMITS`, or pass `batch_size` / `batch_bytes`) and
+    their results are concatenated back in input order. Passing `max_workers`
+    sends up to that many chunks concurrently over the pooled connections.
+
+    Transient failures are retried per chunk following `retry` (a
+    `RetryPolicy`, or False to disable), defaulting to `retry.RETRY_POLICY`.
+    With `isolate_errors=True`, a chunk the server rejects is bisected to find
+    the failing items, which hold their `IndicoError` in the returned
+    `BatchResult` instead of failing the whole call. Passing `hedge` (True,
+    or a `HedgePolicy`) races slow requests against a duplicate.
+
+    `timeout` bounds every HTTP request, in seconds, and defaults to
+    `config.timeout`. `deadline` bounds the whole call, including chunking,
+    rate limiting and retries: once it passes, remaining chunks are
+    abandoned and `DeadlineExceededError` is raised, holding the results of
+    the chunks that completed.
+
+    With `stream=True`, batch calls return a generator of results, decoded
+    one by one as the responses arrive, instead of a list.
+    """
+    request = APIRequest(arg, cloud, api, url_params, **kwargs)
+    if getattr(_DEFERRED, 'active', False):
+        return request
+
+    if request.stream:
+        return stream(request)
+
+    cache = caching.CACHE
+    if cache is not None and request.cache_prefix():
+        return caching.fetch(cache, request, send)
+    return send(request)
+
+
+def send(request):
+    """
+    Send `request`, sharing a single request between concurrent identical
+    calls and grouping single-item calls into batches when coalescing is
+    enabled
+    """
+    key = config.DEDUPLICATE and request.flight_key()
+    if key:
+        return coalesce.SINGLE_FLIGHT.do(key, lambda: send_grouped(request))
+    return send_grouped(request)
+
+
+def send_grouped(request):
+    coalescer = coalesce.COALESCER
+    key = coalescer and request.coalesce_key()
+    if key:
+        return coalescer.submit(key, request.data, lambda items: execute(request.batched(items)))
+    return execute(request)
+
+
+def execute(request):
+    """
+    Send every chunk of `request` and return the merged result. Repeated
+    items of a batch are sent once and their results fanned back out.
+    """
+    request, fan_out = deduplicated(request)
+    try:
+        return fan_out(execute_chunks(request))
+    except DeadlineExceededError as error:
+        if error.results is not None:
+            error.results = fan_out(error.results)
+        raise
+
+
+def deduplicated(request):
+    """
+    Returns `request` without repeated items, and a function mapping its
+    results back to every position of the original request. Repeated
+    positions get copies of the result, as with `SingleFlight`.
+    """
+    if request.stream_body or not (
+        config.DEDUPLICATE and request.chunks != [None] and request.is_prediction()
+    ):
+        return request, lambda results: results
+
+    unique, positions = deduplicate(request.data)
+    if len(unique) == len(request.data):
+        return request, lambda results: results
+
+    def fan_out(results):
+        fanned_out, seen = [], set()
+        for position in positions:
+            result = results[position]
+            fanned_out.append(copy.deepcopy(result) if position in seen else result)
+            seen.add(position)
+        if isinstance(results, BatchResult):
+            return BatchResult(fanned_out, extra_requests=results.extra_requests)
+        return fanned_out
+
+    return request.select(unique), fan_out
+
+
+def execute_chunks(request):
+    """
+    Send every chunk of `request`, each retried on its own according to
+    the request's retry policy, hedged according to its hedge policy and
+    failed over between endpoints when several are configured, and merge
+    the results.
+    """
+    policy = request.retry_policy()
+    hedge = request.hedge_policy()
+    send = partial(hedge.call, send_request) if hedge else send_request
+    if request.pool is not None:
+        send = partial(request.pool.call, send)
+    send_chunk = lambda chunk: policy.call(send, request, chunk, deadline=request.deadline)
+    if not request.isolates_errors():
+        results = dispatch(
+            partial(expiring, send_chunk), request.chunks, max_workers=request.max_workers
+        )
+        return request.finalize(check_expired(request, results))
+
+    outcomes = dispatch(
+        partial(expiring, lambda chunk: isolate(send_chunk, chunk)),
+        request.chunks,
+        max_workers=request.max_workers
+    )
+    check_expired(request, [
+        outcome if isinstance(outcome, DeadlineExceededError) else outcome[0]
+        for outcome in outcomes
+    ])
+    return BatchResult(
+        request.finalize([results for results, _ in outcomes]),
+        extra_requests=sum(extra for _, extra in outcomes)
+    )
+
+
+def expiring(send_chunk, chunk):
+    """
+    `send_chunk(chunk)`, or the `DeadlineExceededError` it raised, so that
+    the other chunks of a call still complete or give up on their own
+    """
+    try:
+        return send_chunk(chunk)
+    except DeadlineExceededError as error:
+        return error
+
+
+def check_expired(request, results):
+    """
+    Returns the results of every chunk of `request`, or raises
+    `DeadlineExceededError` with the partial results if any chunk gave up
+    """
+    expired = [result for result in results if isinstance(result, DeadlineExceededError)]
+    if not expired:
+        return results
+    partial_results = None
+    if request.chunks != [None] and not any(isinstance(result, dict) for result in results):
+        partial_results = []
+        for (start, stop), result in zip(request.chunks, results):
+            expired_chunk = isinstance(result, DeadlineExceededError)
+            partial_results.extend([None] * (stop - start) if expired_chunk else result)
+    raise DeadlineExceededError(str(expired[0]), results=partial_results)
+
+
+def stream(request):
+    """
+    Generator of the results of a batch prediction `request`, in input
+    order, parsed incrementally from each chunk's response. Chunks are sent
+    one after the other, and a chunk that fails transiently partway through
+    is resumed from the first item not yet yielded.
+    """
+    if request.chunks == [None] or not request.is_prediction():
+        raise IndicoError("stream=True is only supported for batch predictions")
+    return stream_chunks(request)
+
+
+def stream_chunks(request):
+    policy = request.retry_policy()
+    retry_on = policy.retry_on + (requests.exceptions.ChunkedEncodingError,)
+    for start, stop in request.chunks:
+        attempt = 1
+        while start < stop:
+            try:
+                for result in stream_request(request, (start, stop)):
+                    start += 1
+                    yield result
+                break
+            except retry_on as error:
+                delay = policy.next_delay(attempt, error)
+                if delay is None:
+                    raise
+                retry.check_deadline(request.deadline, delay, error)
+            time.sleep(delay)
+            attempt += 1
+
+
+def stream_request(request, chunk):
+    body = request.body(chunk)
+    data, headers = encode_body(body)
+    delay, timeout = admit(request, chunk)
+    if delay:
+        time.sleep(delay)
+    with recorded(request, chunk, body, data):
+        response = post(request, data, headers, timeout, stream=True)
+        check_response(request, response.status_code, response.headers)
+    try:
+        for result in codec.iter_results(response.iter_content(config.STREAM_CHUNK_SIZE)):
+            yield result
+    finally:
+        response.close()
+
+
+@contextmanager
+def deferred():
+    """
+    Within this block `api_handler` returns the prepared `APIRequest`
+    instead of sending it.
+    """
+    previous = getattr(_DEFERRED, 'active', False)
+    _DEFERRED.active = True
+    try:
+        yield
+    finally:
+        _DEFERRED.active = previous
+
+
+def then(result, callback):
+    """
+    Apply `callback` to the result of `api_handler`, or attach it to the
+    request when running `deferred`.
+    """
+    if isinstance(result, APIRequest):
+        return result.then(callback)
+    return callback(result)
+
+
+def is_chunked(arg, url_params):
+    """
+    Only batch prediction calls are split; custom collection methods such as
+    `add_data` act on the whole request and are sent as-is.
+    """
+    return (
+        isinstance(arg, (list, LazyItems)) and
+        bool(url_params.get('batch')) and
+        not url_params.get('method')
+    )
+
+
+def encode_batch(items, kwargs):
     """
-    url_params = url_params or {}
-    if type(arg) == bytes:
-        arg = arg.decode('utf-8')
-    if type(arg) == list:
-        arg = [a.decode('utf-8') if type(arg) == bytes else a for a in arg]
-    data = {'data': arg}
-    data.update(**kwargs)
-    json_data = json.dumps(data)
-    cloud = cloud or config.cloud
-    host = "%s.indico.domains" % cloud if cloud else config.PUBLIC_API_HOST
-
-    url = create_url(host, api, dict(kwargs, **url_params))
-    response = requests.post(url, data=json_data, headers=JSON_HEADERS, verify=False)
-
-    warning = response.headers.get('x-warning')
+    Build a JSON request body from already serialized data items, joining
+    them into the body with a single copy.
+    """
+    extra = codec.dumps(kwargs)[1:-1] if kwargs else b""
+    return b"".join([b'{"data":[', b",".join(items), b"]", b"," + extra if extra else b"", b"}"])
+
+
+def stream_batch(items, start, stop, kwargs):
+    """
+    Streaming counterpart of `encode_batch`, encoding `items[start:stop]`
+    one at a time
+    """
+    extra = codec.dumps(kwargs)[1:-1] if kwargs else b""
+    yield b'{"data":['
+    for idx in range(start, stop):
+        yield codec.dumps(items[idx]) if idx == start else b"," + codec.dumps(items[idx])
+    yield b"]" + (b"," + extra if extra else b"") + b"}"
+
+
+def send_request(request, chunk):
+    body = request.body(chunk)
+    data, headers = encode_body(body)
+    delay, timeout = admit(request, chunk)
+    if delay:
+        time.sleep(delay)
+    with recorded(request, chunk, body, data):
+        response = post(request, data, headers, timeout)
+        check_response(request, response.status_code, response.headers)
+        return parse_results(codec.loads(response.content), response.status_code)
+
+
+def post(request, data, headers, timeout, stream=False):
+    """
+    POST `data` to the url of `request` through `transport.TRANSPORT` when
+    one is set, or else through the pooled session of its host
+    """
+    custom = transport.TRANSPORT
+    if custom is not None:
+        return custom.post(request.url, data, headers, timeout=timeout, stream=stream)
+    return get_session(request.host).post(
+        request.url, data=data, headers=headers, verify=False, timeout=timeout, stream=stream
+    )
+
+
+def chunk_items(chunk):
+    return chunk[1] - chunk[0] if chunk else 1
+
+
+def admit(request, chunk):
+    """
+    Check the deadline of `request` and the circuit breaker, then reserve
+    rate limiter quota for sending one chunk of it. Returns the seconds to
+    wait before sending it and the timeout of the request. The quota is
+    given back if waiting for it would pass the deadline.
+    """
+    request.request_timeout()
+    breaker = circuits.BREAKER
+    if breaker is not None:
+        breaker.before(request.host, request.api)
+    limiter = ratelimit.get_rate_limiter(request.cloud)
+    if limiter is None:
+        return 0, request.request_timeout()
+    items = chunk_items(chunk)
+    delay = limiter.reserve(request.host, request.api_key, items)
+    try:
+        return delay, request.request_timeout(delay)
+    except DeadlineExceededError:
+        limiter.release(request.host, request.api_key, items, delay)
+        raise
+
+
+@contextmanager
+def recorded(request, chunk, body, data):
+    """
+    Record the latency and size of sending one chunk of `request`, as `data`
+    on the wire, in `STATS`. Sizes are read once the request completes, so
+    that streamed bodies have been fully produced.
+    """
+    items = chunk_items(chunk)
+    started = time.time()
+    try:
+        yield
+    except Exception as error:
+        STATS.record(
+            request.host, request.api, items, body_size(body), time.time() - started,
+            error=error, batch=chunk is not None, sent=body_size(data)
+        )
+        raise
+    STATS.record(
+        request.host, request.api, items, body_size(body), time.time() - started,
+        batch=chunk is not None, sent=body_size(data)
+    )
+
+
+def check_response(request, status_code, headers):
+    warning = headers.get('x-warning')
     if warning:
         warnings.warn(warning)
 
-    if response.status_code == 503 and cloud != None:
-        raise IndicoError("Private cloud '%s' does not include api '%s'" % (cloud, api))
+    if status_code == 503 and request.cloud != None:
+        raise UnsupportedAPIError("Private cloud '%s' does not include api '%s'" % (request.cloud, request.api))
+
+    if status_code in config.RETRY_STATUSES:
+        raise RetryableError(
+            "The %s api responded with status %d" % (request.api, status_code),
+            status_code=status_code,
+            retry_after=parse_retry_after(headers.get('Retry-After'))
+        )
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait according to a `Retry-After` header, given either as a
+    number of seconds or as an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        date = parsedate_tz(value)
+        return max(mktime_tz(date) - time.time(), 0) if date else None
+
 
-    json_results = response.json()
+def parse_results(json_results, status_code=None):
     results = json_results.get('results', False)
     if results is False:
         error = json_results.get('error')
+        if status_code in config.REQUEST_ERROR_STATUSES:
+            raise RequestError(error, status_code=status_code)
         raise IndicoError(error)
     return results
 
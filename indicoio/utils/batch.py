@@ -0,0 +1,207 @@
+"""
+Splits large batch requests into bounded chunks and stitches results back together
+"""
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+
+from indicoio import config
+from indicoio.utils.errors import (
+    IndicoError, RetryableError, RequestError, UnsupportedAPIError, CircuitOpenError,
+    DeadlineExceededError
+)
+
+# Errors that do not depend on the inputs of a request, so are never isolated
+REQUEST_ERRORS = (
+    RetryableError, RequestError, UnsupportedAPIError, CircuitOpenError, DeadlineExceededError
+)
+
+
+class BatchResult(list):
+    """
+    Results of a batch call made with `isolate_errors=True`. Items the server
+    failed on hold the `IndicoError` raised for them; `extra_requests` counts
+    the additional requests spent isolating them.
+    """
+
+    def __init__(self, results, extra_requests=0):
+        list.__init__(self, results)
+        self.extra_requests = extra_requests
+
+    @property
+    def errors(self):
+        return [(idx, result) for idx, result in enumerate(self) if isinstance(result, IndicoError)]
+
+
+class LazyItems(object):
+    """
+    Batch input whose items are computed by `fn` only when accessed, so that
+    a streamed request body holds one preprocessed item at a time.
+    """
+
+    def __init__(self, items, fn):
+        self.items = items
+        self.fn = fn
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, idx):
+        return self.fn(self.items[idx])
+
+    def __iter__(self):
+        for item in self.items:
+            yield self.fn(item)
+
+
+def batch_limits(api, batch_size=None, batch_bytes=None):
+    """
+    Resolve the (max items, max serialized bytes) bounds for a chunk of `api`,
+    preferring per-call overrides over the per-api defaults in `config.BATCH_LIMITS`.
+    """
+    limits = config.BATCH_LIMITS.get(api) or config.BATCH_LIMITS['default']
+    return (
+        batch_size or limits['size'],
+        batch_bytes or limits['bytes']
+    )
+
+
+def chunk_ranges(sizes, max_items, max_bytes):
+    """
+    Given the serialized size of every item in a batch, returns a list of
+    (start, stop) index ranges such that each range holds at most `max_items`
+    items and at most `max_bytes` bytes. An item larger than `max_bytes` is
+    sent on its own rather than rejected client side.
+    """
+    ranges = []
+    start, chunk_bytes = 0, 0
+    for idx, size in enumerate(sizes):
+        full = idx - start >= max_items or chunk_bytes + size > max_bytes
+        if full and idx > start:
+            ranges.append((start, idx))
+            start, chunk_bytes = idx, 0
+        chunk_bytes += size
+    if start < len(sizes) or not ranges:
+        ranges.append((start, len(sizes)))
+    return ranges
+
+
+def deduplicate(items):
+    """
+    Returns the indices of the first occurrence of every distinct item, and
+    for each item the position of its distinct value in that list.
+    """
+    seen = {}
+    unique, positions = [], []
+    for idx, item in enumerate(items):
+        position = seen.get(item)
+        if position is None:
+            position = seen[item] = len(unique)
+            unique.append(idx)
+        positions.append(position)
+    return unique, positions
+
+
+def worker_count(max_workers, n_chunks):
+    """
+    Number of chunks to send concurrently
+    """
+    return max(min(max_workers or config.MAX_WORKERS, n_chunks), 1)
+
+
+def dispatch(fn, chunks, max_workers=None):
+    """
+    Call `fn` on every chunk, using up to `max_workers` threads, and return
+    the results in chunk order. If any chunk fails, chunks that have not
+    started yet are cancelled and the first error is raised.
+    """
+    max_workers = worker_count(max_workers, len(chunks))
+    if max_workers <= 1:
+        return [fn(chunk) for chunk in chunks]
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(fn, chunk) for chunk in chunks]
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def isolate(send, chunk, error=None):
+    """
+    Send the (start, stop) range `chunk`. If the server rejects its inputs,
+    split it in halves and send those, recursively, until the failing items
+    are isolated. Errors that hit the request as a whole (`REQUEST_ERRORS`)
+    are raised, and once both halves fail with the same error it is taken to
+    apply to every item of the chunk. Returns the results, with an
+    `IndicoError` in place of every failed item, and the number of
+    additional requests made. `error` is the error `chunk` already failed with.
+    """
+    if error is None:
+        try:
+            return send(chunk), 0
+        except REQUEST_ERRORS:
+            raise
+        except IndicoError as failure:
+            error = failure
+
+    start, stop = chunk
+    if stop - start <= 1:
+        return [error] * (stop - start), 0
+    halves = split_range(chunk)
+    outcomes = []
+    for half in halves:
+        try:
+            outcomes.append((send(half), None))
+        except REQUEST_ERRORS:
+            raise
+        except IndicoError as failure:
+            outcomes.append((None, failure))
+
+    extra = len(halves)
+    if same_error(outcomes[0][1], outcomes[1][1]):
+        return [error] * (stop - start), extra
+    results = []
+    for half, (half_results, half_error) in zip(halves, outcomes):
+        if half_error is not None:
+            half_results, half_extra = isolate(send, half, half_error)
+            extra += half_extra
+        results.extend(half_results)
+    return results, extra
+
+
+def split_range(chunk):
+    start, stop = chunk
+    middle = (start + stop) // 2
+    return [(start, middle), (middle, stop)]
+
+
+def same_error(left, right):
+    """
+    Whether both halves of a chunk failed, with the same error
+    """
+    return (left is not None and right is not None and
+            type(left) is type(right) and str(left) == str(right))
+
+
+def merge_results(results):
+    """
+    Concatenate the results of consecutive chunks, in order. Multiapi responses
+    are dictionaries of api name -> {'results': [...]} and are merged per api.
+    """
+    if len(results) == 1:
+        return results[0]
+    if isinstance(results[0], dict):
+        return dict(
+            (api, merge_api_results([result[api] for result in results]))
+            for api in results[0]
+        )
+    return list(chain.from_iterable(results))
+
+
+def merge_api_results(responses):
+    for response in responses:
+        if response.get('results', False) is False:
+            return response
+    return {'results': list(chain.from_iterable(r['results'] for r in responses))}
@@ -0,0 +1,138 @@
+"""
+Fails calls fast while a host and api keep failing
+"""
+import threading
+import time
+from collections import deque
+
+from indicoio.utils.errors import CircuitOpenError, is_overload
+from indicoio.utils.stats import STATS
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the outcome of the last `window` requests to every (host, api).
+    Once at least `min_requests` of them have been seen and `failure_rate`
+    of them failed with an overload error (a retryable status, connection
+    error or timeout), the circuit opens: requests fail immediately with
+    `CircuitOpenError` for `reset_timeout` seconds. The circuit then turns
+    half open and lets up to `half_open_requests` trial requests through;
+    it closes again if they succeed, or reopens if one fails. Trials that
+    report no outcome within `reset_timeout` seconds, such as cancelled
+    coroutines, are given up on and new ones let through.
+
+    The state of every circuit is shown by `states()` and as `circuit` in
+    `indicoio.utils.stats.STATS.snapshot()`.
+    """
+
+    def __init__(self, failure_rate=0.5, min_requests=10, window=50, reset_timeout=30.0,
+                 half_open_requests=1):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_requests = half_open_requests
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def _circuit(self, host, api):
+        circuit = self._circuits.get((host, api))
+        if circuit is None:
+            circuit = self._circuits[(host, api)] = {
+                'state': CLOSED,
+                'outcomes': deque(maxlen=self.window),
+                'opened': None,
+                'trials': 0,
+                'tried': None
+            }
+        return circuit
+
+    def _transition(self, host, api, circuit, state):
+        circuit['state'] = state
+        circuit['trials'] = 0
+        if state == OPEN:
+            circuit['opened'] = time.time()
+        elif state == CLOSED:
+            circuit['outcomes'].clear()
+        STATS.endpoint(host, api).circuit = state
+
+    def before(self, host, api):
+        """
+        Raise `CircuitOpenError` if a request to (host, api) may not be sent now
+        """
+        with self._lock:
+            circuit = self._circuit(host, api)
+            if circuit['state'] == OPEN:
+                remaining = circuit['opened'] + self.reset_timeout - time.time()
+                if remaining > 0:
+                    raise CircuitOpenError(
+                        "Circuit open for api '%s' on %s after repeated failures" % (api, host),
+                        retry_after=remaining
+                    )
+                self._transition(host, api, circuit, HALF_OPEN)
+
+            if circuit['state'] == HALF_OPEN:
+                if circuit['trials'] and time.time() - circuit['tried'] >= self.reset_timeout:
+                    circuit['trials'] = 0
+                if circuit['trials'] >= self.half_open_requests:
+                    raise CircuitOpenError(
+                        "Circuit half open for api '%s' on %s, waiting on trial requests" % (api, host),
+                        retry_after=0
+                    )
+                circuit['trials'] += 1
+                circuit['tried'] = time.time()
+
+    def observe(self, host, api, items, nbytes, latency, error=None, batch=False):
+        """
+        Record the outcome of a request to (host, api)
+        """
+        failed = is_overload(error)
+        with self._lock:
+            circuit = self._circuit(host, api)
+            if circuit['state'] == HALF_OPEN:
+                self._transition(host, api, circuit, OPEN if failed else CLOSED)
+            elif circuit['state'] == CLOSED:
+                outcomes = circuit['outcomes']
+                outcomes.append(failed)
+                if (len(outcomes) >= self.min_requests and
+                        sum(outcomes) >= self.failure_rate * len(outcomes)):
+                    self._transition(host, api, circuit, OPEN)
+
+    def __call__(self, *args, **kwargs):
+        self.observe(*args, **kwargs)
+
+    def states(self):
+        """
+        State and recent failure rate of every circuit
+        """
+        with self._lock:
+            return dict(
+                ("%s/%s" % (host, api), {
+                    'state': circuit['state'],
+                    'failure_rate': (
+                        float(sum(circuit['outcomes'])) / len(circuit['outcomes'])
+                        if circuit['outcomes'] else 0.0
+                    )
+                })
+                for (host, api), circuit in self._circuits.items()
+            )
+
+
+BREAKER = None
+
+
+def set_circuit_breaker(breaker):
+    """
+    Guard every request with `breaker`, a `CircuitBreaker`, or pass None to
+    disable it. Returns the previous breaker.
+    """
+    global BREAKER
+    previous = BREAKER
+    if previous is not None:
+        STATS.unsubscribe(previous)
+    BREAKER = breaker
+    if breaker is not None:
+        STATS.subscribe(breaker)
+    return previous
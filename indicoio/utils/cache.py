@@ -0,0 +1,322 @@
+"""
+Caches api results per input item, keyed by a hash of the preprocessed data
+"""
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from indicoio.utils.batch import BatchResult
+from indicoio.utils import codec
+from indicoio.utils.errors import DeadlineExceededError
+
+MISSING = object()
+
+
+class MemoryCache(object):
+    """
+    Thread-safe in-process cache with LRU eviction, bounded by number of
+    entries and optionally by the serialized size of the cached results.
+    Entries older than `ttl` seconds are treated as missing. Results are
+    copied in and out, so callers may modify the results they get.
+    """
+
+    def __init__(self, max_items=10000, max_bytes=None, ttl=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or (entry[1] is not None and entry[1] < time.time()):
+                if entry is not None:
+                    self.size -= entry[2]
+                self.misses += 1
+                return MISSING
+            self._entries[key] = entry
+            self.hits += 1
+            return copy.deepcopy(entry[0])
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        expires = time.time() + self.ttl if self.ttl else None
+        size = len(json.dumps(value)) if self.max_bytes else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+            self._entries[key] = (value, expires, size)
+            self.size += size
+            while self._entries and (
+                len(self._entries) > self.max_items or
+                (self.max_bytes and self.size > self.max_bytes)
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted[2]
+
+    def set_many(self, items):
+        for key, value in items:
+            self.set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self.size
+        }
+
+
+class DiskCache(object):
+    """
+    Cache persisted to a sqlite database in WAL mode, so that it can be
+    shared by concurrent readers and writers across processes and survives
+    process restarts. The total serialized size of the cached results is
+    capped at `max_bytes`, evicting the least recently used entries first.
+    Entries older than `ttl` seconds are treated as missing. Database errors,
+    such as the database staying locked for `timeout` seconds, are treated
+    as cache misses and failures to cache.
+    """
+
+    def __init__(self, path, max_bytes=1024 ** 3, ttl=None, timeout=30):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, accessed REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('size', 0)")
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def get(self, key):
+        now = time.time()
+        try:
+            db = self._connection()
+            row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is None or (self.ttl and row[1] + self.ttl < now):
+            self.misses += 1
+            return MISSING
+        try:
+            db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            pass
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def set_many(self, items):
+        """
+        Cache every (key, value) of `items` in a single transaction, evicting
+        once for all of them
+        """
+        now = time.time()
+        rows = [(key, json.dumps(value)) for key, value in items]
+        if not rows:
+            return
+        try:
+            with self._transaction() as db:
+                growth = 0
+                for key, value in rows:
+                    previous = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                    db.execute(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                        (key, value, len(value), now, now)
+                    )
+                    growth += len(value) - (previous[0] if previous else 0)
+                db.execute("UPDATE meta SET value = value + ? WHERE name = 'size'", (growth,))
+                self._evict(db, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, db, now):
+        if self.ttl:
+            self._delete(db, db.execute(
+                "SELECT key, size FROM entries WHERE created < ?", (now - self.ttl,)
+            ).fetchall())
+
+        excess = db.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()[0] - self.max_bytes
+        evicted = []
+        if excess > 0:
+            for key, size in db.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                evicted.append((key, size))
+                excess -= size
+                if excess <= 0:
+                    break
+        self._delete(db, evicted)
+
+    def _delete(self, db, entries):
+        if not entries:
+            return
+        db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in entries])
+        freed = sum(size for _, size in entries)
+        db.execute("UPDATE meta SET value = value - ? WHERE name = 'size'", (freed,))
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM entries")
+            db.execute("UPDATE meta SET value = 0 WHERE name = 'size'")
+
+    def stats(self):
+        db = self._connection()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            'bytes': db.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()[0]
+        }
+
+
+class _Transaction(object):
+    """
+    Write transaction that takes the database lock up front, so concurrent
+    writers queue up instead of failing to upgrade a read lock.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+CACHE = None
+
+
+def set_cache(cache):
+    """
+    Cache api results in `cache` (a `MemoryCache`, a `DiskCache`, or any
+    object with the same `get` / `set` methods, and optionally `set_many`),
+    or pass None to disable caching.
+    """
+    global CACHE
+    CACHE = cache
+
+
+def item_key(prefix, item):
+    return hashlib.sha1(prefix.encode('utf-8') + item).hexdigest()
+
+
+class Lookup(object):
+    """
+    The results of `request` found in `cache`, and in `missing` the request
+    for the rest (a batch of only the missing items), or None if every
+    result was found. Shared by the sync and `indicoio.aio` clients.
+    """
+
+    def __init__(self, cache, request):
+        self.cache = cache
+        self.request = request
+        prefix = request.cache_prefix()
+        if request.chunks == [None]:
+            self.keys = [item_key(prefix, codec.dumps(request.data))]
+        else:
+            self.keys = [item_key(prefix, item) for item in request.data]
+        self.results = [cache.get(key) for key in self.keys]
+        self.misses = [idx for idx, result in enumerate(self.results) if result is MISSING]
+        if not self.misses:
+            self.missing = None
+        elif request.chunks == [None]:
+            self.missing = request
+        else:
+            self.missing = request.select(self.misses)
+
+    def _store(self, fetched):
+        entries = []
+        for idx, result in zip(self.misses, fetched):
+            self.results[idx] = result
+            if result is not None and not isinstance(result, Exception):
+                entries.append((self.keys[idx], result))
+        set_many = getattr(self.cache, 'set_many', None)
+        if set_many is not None:
+            set_many(entries)
+        else:
+            for key, result in entries:
+                self.cache.set(key, result)
+
+    def merge(self, fetched=None):
+        """
+        The results of the whole request, given the results `fetched` for
+        `missing`, which are cached
+        """
+        if self.request.chunks == [None]:
+            if self.missing is not None:
+                self._store([fetched])
+            return self.results[0]
+        if self.missing is not None:
+            self._store(fetched)
+        if self.request.isolates_errors():
+            return BatchResult(self.results, extra_requests=getattr(fetched, 'extra_requests', 0))
+        return self.results
+
+    def merge_expired(self, error):
+        """
+        Place the partial results of a `DeadlineExceededError` raised for
+        `missing` among the results found in the cache
+        """
+        if error.results is not None and self.request.chunks != [None]:
+            self._store(error.results)
+            error.results = self.results
+
+
+def fetch(cache, request, send):
+    """
+    Resolve `request` from `cache` where possible. For batch requests only
+    the items missing from the cache are sent (with `send`), and the results
+    are merged back in input order, also into the partial results of a
+    `DeadlineExceededError`.
+    """
+    lookup = Lookup(cache, request)
+    if lookup.missing is None:
+        return lookup.merge()
+    try:
+        fetched = send(lookup.missing)
+    except DeadlineExceededError as error:
+        lookup.merge_expired(error)
+        raise
+    return lookup.merge(fetched)
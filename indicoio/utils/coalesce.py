@@ -0,0 +1,126 @@
+"""
+Coalesces concurrent calls into shared or batch requests
+"""
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class _Group(object):
+
+    def __init__(self):
+        self.items = []
+        self.futures = []
+        self.full = threading.Event()
+
+
+class Coalescer(object):
+    """
+    Gathers items submitted concurrently under the same key for up to
+    `max_delay` seconds or `max_items` items, then sends them together.
+
+    The first thread to submit under a key leads the group: it waits for the
+    group to fill up, sends it, and resolves every other caller's future with
+    its own element of the batch result, or with its own error if `send`
+    returns an exception in place of that element. No background thread is
+    involved.
+    """
+
+    def __init__(self, max_delay=0.005, max_items=100):
+        self.max_delay = max_delay
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def submit(self, key, item, send):
+        """
+        Add `item` to the group for `key` and block until its result is known.
+        `send` receives the list of grouped items and must return one result
+        per item, in order.
+        """
+        future = Future()
+        with self._lock:
+            group = self._groups.get(key)
+            leader = group is None
+            if leader:
+                group = self._groups[key] = _Group()
+            group.items.append(item)
+            group.futures.append(future)
+            if len(group.items) >= self.max_items:
+                del self._groups[key]
+                group.full.set()
+
+        if leader:
+            group.full.wait(self.max_delay)
+            with self._lock:
+                if self._groups.get(key) is group:
+                    del self._groups[key]
+            self._resolve(group, send)
+
+        return future.result()
+
+    def _resolve(self, group, send):
+        try:
+            results = send(group.items)
+        except Exception as e:
+            for future in group.futures:
+                future.set_exception(e)
+        else:
+            for future, result in zip(group.futures, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+class SingleFlight(object):
+    """
+    Lets concurrent identical calls share a single request: while a call
+    for a key is in flight, other callers with the same key wait for its
+    result instead of sending their own. Each waiting caller receives its own
+    copy of the result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = fn()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+SINGLE_FLIGHT = SingleFlight()
+COALESCER = None
+
+
+def enable_coalescing(max_delay=0.005, max_items=100):
+    """
+    Opt in to coalescing: concurrent single-item calls to the same api, with
+    the same version and arguments, are sent as one batch request.
+    """
+    global COALESCER
+    COALESCER = Coalescer(max_delay=max_delay, max_items=max_items)
+
+
+def disable_coalescing():
+    global COALESCER
+    COALESCER = None
@@ -0,0 +1,179 @@
+"""
+JSON encoding of request bodies and decoding of responses
+"""
+import codecs
+import json
+import re
+
+from indicoio.utils.errors import IndicoError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONCodec(object):
+    """
+    Standard library codec, always available
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        data = json.dumps(obj)
+        return data if isinstance(data, bytes) else data.encode('utf-8')
+
+    def loads(self, data):
+        if not isinstance(data, str):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+    """
+    Codec backed by `orjson`, which encodes straight to bytes, decodes
+    bytes without an intermediate str, and serializes numpy arrays natively
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        self.options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, option=self.options)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+CODECS = {'json': JSONCodec}
+if orjson is not None:
+    CODECS['orjson'] = OrjsonCodec
+
+CODEC = OrjsonCodec() if orjson is not None else JSONCodec()
+
+
+def set_codec(codec):
+    """
+    Encode and decode with `codec`, a codec name (see `CODECS`) or any
+    object with `dumps` (to bytes) and `loads` (from bytes) methods.
+    Returns the previous codec.
+    """
+    global CODEC
+    previous = CODEC
+    if codec in CODECS:
+        codec = CODECS[codec]()
+    elif not (hasattr(codec, 'dumps') and hasattr(codec, 'loads')):
+        raise ValueError("Unknown JSON codec %r, expected one of %s" % (codec, sorted(CODECS)))
+    CODEC = codec
+    return previous
+
+
+def dumps(obj):
+    return CODEC.dumps(obj)
+
+
+def loads(data):
+    return CODEC.loads(data)
+
+
+class BodyStream(object):
+    """
+    Request body produced piece by piece as it is sent, counting the bytes
+    it has produced so far in `size`
+    """
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.size = 0
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.size += len(piece)
+            yield piece
+
+
+def body_size(body):
+    return body.size if isinstance(body, BodyStream) else len(body)
+
+
+class _Reader(object):
+    """
+    Decodes JSON values one at a time from an iterable of byte strings,
+    keeping only the text not yet consumed in memory
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'\s*')
+    number_tail = re.compile(r'[0-9.eE+-]*$')
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.pos = 0
+
+    def fill(self):
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer = self.buffer[self.pos:] + self.text.decode(chunk)
+                self.pos = 0
+                return
+        raise IndicoError("The response ended before its results were complete")
+
+    def peek(self):
+        while True:
+            self.pos = self.whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise IndicoError("Unexpected %r in the response" % self.buffer[self.pos])
+        self.pos += 1
+
+    def value(self):
+        """
+        The next value, only once a character that cannot continue it has
+        arrived, so a number split across chunks (`0.` or `1e`) is not read
+        short
+        """
+        while True:
+            self.peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) and not self.number_tail.match(self.buffer, end):
+                    self.pos = end
+                    return value
+            except ValueError:
+                pass
+            self.fill()
+
+
+def iter_results(chunks):
+    """
+    Incrementally parse a response body, given as an iterable of byte
+    strings, yielding every element of its `results` array as soon as it is
+    complete. Raises `IndicoError` if the response holds an error instead.
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    while reader.peek() != '}':
+        key = reader.value()
+        reader.expect(':')
+        if key == 'results' and reader.peek() == '[':
+            reader.pos += 1
+            while reader.peek() != ']':
+                yield reader.value()
+                if reader.peek() == ',':
+                    reader.pos += 1
+            return
+        value = reader.value()
+        if key == 'results':
+            yield value
+            return
+        if key == 'error':
+            raise IndicoError(value)
+        if reader.peek() == ',':
+            reader.pos += 1
+    raise IndicoError(None)
@@ -0,0 +1,60 @@
+"""
+Gzip compression of large request bodies
+"""
+import zlib
+
+from indicoio import JSON_HEADERS
+from indicoio import config
+from indicoio.utils.codec import BodyStream
+
+GZIP_HEADERS = dict(JSON_HEADERS, **{
+    'Content-Encoding': 'gzip',
+    'Accept-Encoding': 'gzip, deflate'
+})
+
+
+def set_compression(min_bytes, level=None):
+    """
+    Gzip request bodies of at least `min_bytes` bytes, at compression
+    `level` (1 to 9), or pass None to send every body uncompressed.
+    Also configurable with `gzip_min_bytes` / `gzip_level` in the
+    [connection] section of .indicorc, or INDICO_GZIP_MIN_BYTES / INDICO_GZIP_LEVEL.
+    """
+    config.gzip_min_bytes = min_bytes
+    if level is not None:
+        config.gzip_level = level
+
+
+def gzip(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_stream(pieces, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for piece in pieces:
+        data = compressor.compress(piece)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode_body(body):
+    """
+    Returns the bytes and headers to send the encoded JSON `body` with,
+    gzipped if it is at least `config.gzip_min_bytes` long and compression
+    shrinks it. A streamed body, whose size is not known up front, is
+    gzipped as it is produced whenever compression is enabled.
+    """
+    if isinstance(body, BodyStream):
+        if config.gzip_min_bytes is None:
+            return body, JSON_HEADERS
+        return BodyStream(gzip_stream(body, config.gzip_level)), GZIP_HEADERS
+
+    min_bytes = config.gzip_min_bytes
+    if min_bytes is None or len(body) < min_bytes:
+        return body, JSON_HEADERS
+    compressed = gzip(body, config.gzip_level)
+    if len(compressed) >= len(body):
+        return body, JSON_HEADERS
+    return compressed, GZIP_HEADERS
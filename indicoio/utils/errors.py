@@ -5,6 +5,50 @@ Contains Indico Custom Errors
 class IndicoError(ValueError):
     pass
 
+class UnsupportedAPIError(IndicoError):
+    """
+    The private cloud a request was sent to does not serve the requested api
+    """
+    pass
+
+class RetryableError(IndicoError):
+    """
+    The server responded in a way that may succeed if the request is retried,
+    such as throttling (429) or a server error (5xx)
+    """
+    def __init__(self, message, status_code=None, retry_after=None):
+        IndicoError.__init__(self, message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class RequestError(IndicoError):
+    """
+    The server rejected the request as a whole, such as for an invalid API
+    key (401), rather than any one of its inputs
+    """
+    def __init__(self, message, status_code=None):
+        IndicoError.__init__(self, message)
+        self.status_code = status_code
+
+class CircuitOpenError(IndicoError):
+    """
+    Requests to this host and api are failing, so the circuit breaker is
+    failing calls fast until `retry_after` seconds have passed
+    """
+    def __init__(self, message, retry_after=None):
+        IndicoError.__init__(self, message)
+        self.retry_after = retry_after
+
+class DeadlineExceededError(IndicoError):
+    """
+    The `deadline` of a call passed before it completed. For batch calls,
+    `results` holds the results of the chunks that did complete, in input
+    order, with None in place of every item that was abandoned.
+    """
+    def __init__(self, message, results=None):
+        IndicoError.__init__(self, message)
+        self.results = results
+
 class DataStructureException(Exception):
     """
     If a non-accepted datastructure is passed, throws an exception
@@ -18,3 +62,12 @@ class DataStructureException(Exception):
         return """
         function %s does not accept %s, accepted types are: %s
         """ % (self.callback, self.structure, str(self.accepted))
+
+def is_overload(error):
+    """
+    Whether `error` suggests the server is overloaded or unreachable,
+    rather than rejecting the input
+    """
+    if error is None:
+        return False
+    return isinstance(error, RetryableError) or not isinstance(error, IndicoError)
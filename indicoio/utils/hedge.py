@@ -0,0 +1,129 @@
+"""
+Hedged requests: a slow request is raced against a duplicate
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from indicoio.utils.stats import STATS
+
+
+class HedgePolicy(object):
+    """
+    Sends a duplicate of a request that has not completed within the
+    `percentile` latency of the last requests to its host and api, as
+    measured in `indicoio.utils.stats.STATS`, and returns whichever
+    finishes first. No request is hedged until `min_samples` latencies have
+    been recorded, and at most `max_ratio` of all requests are hedged.
+
+    Only single-item calls are hedged, against the latencies of single-item
+    requests, unless `batches` is set: batch chunks are then hedged too,
+    against the per-item latency of batch requests times their size.
+
+    The losing request is cancelled if it has not started yet; otherwise its
+    response is discarded when it arrives (`indicoio.aio` cancels it outright).
+    Only idempotent prediction calls are hedged.
+    """
+
+    def __init__(self, percentile=95, max_ratio=0.05, min_samples=20, max_workers=32,
+                 batches=False):
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.batches = batches
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def delay(self, host, api, chunk=None):
+        """
+        Seconds to wait before hedging a new request to (host, api) for the
+        (start, stop) range `chunk` of a batch, or a single item if None, or
+        None if it should not be hedged
+        """
+        with self._lock:
+            self.requests += 1
+        stats = STATS.endpoint(host, api)
+        latencies = stats.single_latencies if chunk is None else stats.item_latencies
+        if len(latencies) < self.min_samples:
+            return None
+        delay = stats.percentile(self.percentile, latencies)
+        return delay if chunk is None else delay * (chunk[1] - chunk[0])
+
+    def allow(self):
+        """
+        Whether a hedge may be sent now without exceeding `max_ratio`
+        """
+        with self._lock:
+            if self.hedges + 1 > self.max_ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def won(self):
+        with self._lock:
+            self.wins += 1
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers)
+            return self._executor
+
+    def call(self, send, request, chunk):
+        """
+        `send(request, chunk)`, hedged
+        """
+        delay = self.delay(request.host, request.api, chunk)
+        if delay is None:
+            return send(request, chunk)
+
+        executor = self.executor()
+        primary = executor.submit(send, request, chunk)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.allow():
+            return primary.result()
+
+        hedge = executor.submit(send, request, chunk)
+        pending = [primary, hedge]
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if future is hedge:
+                        self.won()
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self):
+        return {'requests': self.requests, 'hedges': self.hedges, 'wins': self.wins}
+
+
+HEDGE_POLICY = None
+
+
+def set_hedge_policy(policy):
+    """
+    Hedge every eligible call with `policy`, a `HedgePolicy`, or pass None
+    to only hedge calls made with `hedge=`.
+    """
+    global HEDGE_POLICY
+    HEDGE_POLICY = policy
+
+
+def get_policy(hedge=None):
+    if hedge is False:
+        return None
+    if hedge is True:
+        return HEDGE_POLICY or DEFAULT_POLICY
+    return hedge or HEDGE_POLICY
+
+
+DEFAULT_POLICY = HedgePolicy()
@@ -3,19 +3,24 @@ Image Utils
 Handles preprocessing images before they are sent to the server
 """
 import os.path, base64, re, warnings
+from functools import partial
 from six import BytesIO, string_types, PY3
 
 from PIL import Image
 
 from indicoio.utils.errors import IndicoError
+from indicoio.utils.batch import LazyItems
 
 B64_PATTERN = re.compile("^([A-Za-z0-9+/]{4})*([A-Za-z0-9+/]{4}|[A-Za-z0-9+/]{3}=|[A-Za-z0-9+/]{2}==)")
 
-def image_preprocess(image, size=None, min_axis=None, batch=False):
+def image_preprocess(image, size=None, min_axis=None, batch=False, lazy=False):
     """
     Takes an image and prepares it for sending to the api including
-    resizing and image data/structure standardizing.
+    resizing and image data/structure standardizing. With `lazy=True`, a
+    batch is preprocessed one image at a time as it is read.
     """
+    if batch and lazy:
+        return LazyItems(list(image), partial(image_preprocess, size=size, min_axis=min_axis))
     if batch:
         return [image_preprocess(img, size=size, min_axis=min_axis, batch=False) for img in image]
 
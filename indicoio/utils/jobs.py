@@ -0,0 +1,197 @@
+"""
+Checkpointed batch jobs that resume where they stopped
+"""
+import hashlib
+import json
+import os
+import time
+
+from indicoio.utils.errors import IndicoError
+from indicoio.utils.stream import chunk_inputs, imap_chunks
+
+JOB_DIRECTORY = os.path.join("~", ".indico", "jobs")
+
+
+class Job(object):
+    """
+    Runs `api` over every input of `data`, a list or any iterable, and
+    journals each completed chunk along with its results to
+    `<directory>/<job_id>.jsonl`.
+
+    Running a job again with the same id and the same input skips the chunks
+    already in the journal, so a worker that crashed or was stopped picks up
+    exactly where it left off. Every chunk is journaled with a fingerprint of
+    its inputs, and chunks whose inputs changed since are run again. Only one
+    process should run a given job id at a time.
+
+    Example usage:
+
+    .. code-block:: python
+
+       >>> from indicoio.utils.jobs import Job
+       >>> job = Job(indicoio.image_features, paths, job_id="nightly-features")
+       >>> features = job.run()
+
+    Extra keyword arguments are passed to `api`, e.g. `isolate_errors=True`
+    so that a bad input does not stop the job.
+    """
+
+    def __init__(self, api, data, job_id, directory=None, chunk_size=100,
+                 concurrency=4, callback=None, **kwargs):
+        self.api = api
+        self.data = data
+        self.job_id = job_id
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.callback = callback
+        self.kwargs = kwargs
+
+        directory = os.path.expanduser(directory or JOB_DIRECTORY)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, "%s.jsonl" % job_id)
+        self.total = len(data) if hasattr(data, "__len__") else None
+        self.started = None
+        self.done_this_run = 0
+        self.chunks = self._load()
+        self.done = sum(stop - start for start, (stop, _, _) in self.chunks.items())
+
+    def _load(self):
+        """
+        Read the journal, returning {start: (stop, offset, fingerprint)} for
+        every completed chunk. A line left incomplete by a crash is truncated
+        away, and a journal whose header is incomplete is started over.
+        """
+        header = {"job_id": self.job_id, "chunk_size": self.chunk_size}
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as journal:
+                self._write(journal, header)
+            return {}
+
+        chunks = {}
+        with open(self.path, "rb+") as journal:
+            line = journal.readline()
+            try:
+                found = json.loads(line.decode("utf-8"))
+            except ValueError:
+                journal.truncate(0)
+                journal.seek(0)
+                self._write(journal, header)
+                return {}
+            if found != header:
+                raise IndicoError(
+                    "Journal %s was written for a different job or chunk size" % self.path
+                )
+            offset = journal.tell()
+            for line in iter(journal.readline, b""):
+                try:
+                    entry = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    break
+                chunks[entry["start"]] = (entry["stop"], offset, entry.get("fingerprint"))
+                offset += len(line)
+            journal.truncate(offset)
+        return chunks
+
+    def _write(self, journal, entry):
+        journal.write((json.dumps(entry) + "\n").encode("utf-8"))
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    def run(self):
+        """
+        Process every chunk not yet in the journal, or journaled for other
+        inputs, and return all results, in input order.
+        """
+        fingerprints = {}
+
+        def remaining():
+            for start, chunk in chunk_inputs(self.data, self.chunk_size):
+                fingerprints[start] = fingerprint(chunk)
+                if self.chunks.get(start, (None, None, None))[2] != fingerprints[start]:
+                    yield start, chunk
+
+        self.started = time.time()
+        with open(self.path, "ab") as journal:
+            journal.seek(0, os.SEEK_END)
+            for start, results in imap_chunks(
+                self.api, remaining(), self.concurrency, ordered=False, **self.kwargs
+            ):
+                if start in self.chunks:
+                    self.done -= self.chunks[start][0] - start
+                stop = start + len(results)
+                self.chunks[start] = (stop, journal.tell(), fingerprints[start])
+                self._write(journal, {
+                    "start": start,
+                    "stop": stop,
+                    "fingerprint": fingerprints[start],
+                    "results": [encode_result(result) for result in results]
+                })
+                self.done += len(results)
+                self.done_this_run += len(results)
+                if self.callback:
+                    self.callback(self.progress())
+
+        self.chunks = dict((start, self.chunks[start]) for start in fingerprints)
+        self.done = sum(stop - start for start, (stop, _, _) in self.chunks.items())
+        return self.results()
+
+    def results(self):
+        """
+        Results of every completed chunk, in input order
+        """
+        results = []
+        with open(self.path, "rb") as journal:
+            for start in sorted(self.chunks):
+                journal.seek(self.chunks[start][1])
+                entry = json.loads(journal.readline().decode("utf-8"))
+                results.extend(decode_result(result) for result in entry["results"])
+        return results
+
+    def progress(self):
+        """
+        Items done (including previous runs), total items if known, rate in
+        items per second for this run, and estimated seconds remaining
+        """
+        elapsed = time.time() - self.started if self.started else 0
+        rate = self.done_this_run / elapsed if elapsed else None
+        remaining = self.total - self.done if self.total is not None else None
+        return {
+            "done": self.done,
+            "total": self.total,
+            "rate": rate,
+            "eta": remaining / rate if rate and remaining is not None else None
+        }
+
+    def remove(self):
+        """
+        Delete the journal of this job
+        """
+        os.remove(self.path)
+
+
+def fingerprint(items):
+    """
+    sha1 of the inputs of a chunk. Arrays and images are hashed by their
+    shape and raw bytes.
+    """
+    def serializable(item):
+        if hasattr(item, "tobytes"):
+            shape = getattr(item, "shape", None) or getattr(item, "size", None)
+            return [repr(shape), hashlib.sha1(item.tobytes()).hexdigest()]
+        return repr(item)
+
+    encoded = json.dumps(items, sort_keys=True, default=serializable)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def encode_result(result):
+    if isinstance(result, IndicoError):
+        return {"__error__": str(result)}
+    return result
+
+
+def decode_result(result):
+    if isinstance(result, dict) and list(result) == ["__error__"]:
+        return IndicoError(result["__error__"])
+    return result
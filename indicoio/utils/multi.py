@@ -1,5 +1,5 @@
 from indicoio.config import TEXT_APIS, IMAGE_APIS, API_NAMES, MULTIAPI_NOT_SUPPORTED
-from indicoio.utils.api import api_handler
+from indicoio.utils.api import api_handler, then
 from indicoio.utils.image import image_preprocess
 from indicoio.utils.errors import IndicoError
 from indicoio.utils.decorators import detect_batch_decorator
@@ -94,7 +94,7 @@ def multi(data, datatype, apis, batch=False, **kwargs):
         },
         **kwargs
     )
-    return handle_response(result)
+    return then(result, handle_response)
 
 
 def handle_response(result):
@@ -0,0 +1,182 @@
+"""
+Paces requests client side to stay within a request and item quota
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at `rate` tokens per second and holding at most
+    `capacity`. Tokens are reserved up front, letting the balance go
+    negative, so concurrent callers queue up behind each other and are
+    spaced evenly instead of retrying in bursts.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take `tokens` from the bucket and return how many seconds to wait
+        before using them
+        """
+        with self._lock:
+            self.tokens, self.updated, delay = refill(
+                self.tokens, self.updated, self.rate, self.capacity, tokens
+            )
+            return delay
+
+
+class FileTokenBucket(object):
+    """
+    `TokenBucket` whose state lives in a file locked with `fcntl.flock`, so
+    that every process on the host using the same `path` shares the quota.
+    """
+    state = struct.Struct('dd')
+
+    def __init__(self, rate, capacity, path):
+        import fcntl
+        self.flock = fcntl.flock
+        self.lock_ex, self.lock_un = fcntl.LOCK_EX, fcntl.LOCK_UN
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def reserve(self, tokens=1):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                self.flock(fd, self.lock_ex)
+                data = os.read(fd, self.state.size)
+                if len(data) == self.state.size:
+                    balance, updated = self.state.unpack(data)
+                else:
+                    balance, updated = self.capacity, time.time()
+                balance, updated, delay = refill(
+                    balance, updated, self.rate, self.capacity, tokens
+                )
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, self.state.pack(balance, updated))
+                return delay
+            finally:
+                self.flock(fd, self.lock_un)
+                os.close(fd)
+
+
+def refill(balance, updated, rate, capacity, tokens):
+    """
+    Returns the balance and update time of a bucket after refilling it
+    and taking `tokens`, and the seconds to wait for them. Negative
+    `tokens` are returned to the bucket.
+    """
+    now = time.time()
+    balance = min(capacity, min(capacity, balance + (now - updated) * rate) - tokens)
+    return balance, now, max(0.0, -balance / rate)
+
+
+class RateLimiter(object):
+    """
+    Limits requests to `requests_per_second` and input items (counting
+    every item of a batch) to `items_per_second`, separately for every API
+    key and host, i.e. per key on the public API and per private cloud.
+    Up to `burst` seconds worth of unused quota may be spent at once.
+
+    With `directory`, buckets are kept in files in that directory and
+    shared by all processes on the host (POSIX only). `waited` totals the
+    seconds requests were delayed.
+
+    Example usage:
+
+    .. code-block:: python
+
+       >>> from indicoio.utils.ratelimit import RateLimiter, set_rate_limiter
+       >>> set_rate_limiter(RateLimiter(requests_per_second=10, items_per_second=500,
+       ...                              directory="~/.indico/ratelimit"))
+    """
+
+    def __init__(self, requests_per_second=None, items_per_second=None, burst=1.0,
+                 directory=None):
+        self.requests_per_second = requests_per_second
+        self.items_per_second = items_per_second
+        self.burst = burst
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _bucket(self, scope, kind, rate):
+        key = (scope, kind)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                capacity = max(rate * self.burst, 1)
+                if self.directory:
+                    name = hashlib.sha1(json.dumps([scope, kind]).encode('utf-8')).hexdigest()
+                    path = os.path.join(self.directory, name + ".bucket")
+                    bucket = FileTokenBucket(rate, capacity, path)
+                else:
+                    bucket = TokenBucket(rate, capacity)
+                self._buckets[key] = bucket
+            return bucket
+
+    def reserve(self, host, api_key, items=1):
+        """
+        Reserve quota for a request of `items` items and return the
+        seconds to wait before sending it
+        """
+        scope = (host, api_key)
+        delay = 0.0
+        if self.requests_per_second:
+            delay = self._bucket(scope, 'requests', self.requests_per_second).reserve(1)
+        if self.items_per_second:
+            delay = max(delay, self._bucket(scope, 'items', self.items_per_second).reserve(items))
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+
+    def release(self, host, api_key, items=1, delay=0.0):
+        """
+        Give back the quota reserved for a request of `items` items, which
+        was to wait `delay` seconds, when it is not sent after all
+        """
+        scope = (host, api_key)
+        if self.requests_per_second:
+            self._bucket(scope, 'requests', self.requests_per_second).reserve(-1)
+        if self.items_per_second:
+            self._bucket(scope, 'items', self.items_per_second).reserve(-items)
+        if delay:
+            with self._lock:
+                self.waited -= delay
+
+
+RATE_LIMITERS = {}
+
+
+def set_rate_limiter(limiter, cloud=None):
+    """
+    Pace requests with `limiter`, a `RateLimiter`, or pass None to stop
+    pacing. With `cloud`, the limiter only applies to that private cloud;
+    otherwise it applies to every host without a limiter of its own.
+    """
+    if limiter is None:
+        RATE_LIMITERS.pop(cloud, None)
+    else:
+        RATE_LIMITERS[cloud] = limiter
+
+
+def get_rate_limiter(cloud):
+    return RATE_LIMITERS.get(cloud) or RATE_LIMITERS.get(None)
@@ -0,0 +1,149 @@
+"""
+Records traffic to disk and replays it, for performance regression runs
+without the network
+"""
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+import requests
+
+from indicoio.utils.transport import Transport, HTTPTransport, Response, body_bytes, decoded_body
+
+KEY_PATTERN = re.compile(r'([?&]key=)[^&]*')
+REDACTED = 'REDACTED'
+
+# Response headers kept in a recording, as used by the client
+HEADERS = ('Content-Type', 'Retry-After', 'x-warning')
+
+ERRORS = {
+    'Timeout': requests.Timeout,
+    'ConnectionError': requests.ConnectionError,
+}
+
+
+def redact(url):
+    """
+    `url` with its api key replaced by "REDACTED"
+    """
+    return KEY_PATTERN.sub(r'\g<1>' + REDACTED, url)
+
+
+def load(path):
+    """
+    The recorded exchanges in the recording at `path`, in order
+    """
+    with gzip.open(path, 'rb') as recording:
+        return [json.loads(line.decode('utf-8')) for line in recording if line.strip()]
+
+
+class RecordingTransport(Transport):
+    """
+    Sends requests through `transport` (HTTP by default) and appends each
+    exchange to the gzipped JSON lines file at `path`: the url with the api
+    key redacted, the uncompressed request body, the response status,
+    headers and body, when it was sent relative to the first request and
+    how long it took. Failures such as timeouts are recorded too.
+
+    Streamed responses are read in full before they are returned.
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport or HTTPTransport()
+        self.started = None
+        self._lock = threading.Lock()
+        self._file = None
+
+    def post(self, url, data, headers, timeout=None, stream=False):
+        data = body_bytes(data)
+        exchange = {'url': redact(url), 'request': decoded_body(data, headers).decode('utf-8')}
+        sent = time.time()
+        try:
+            response = self.transport.post(url, data, headers, timeout=timeout, stream=stream)
+            content = response.content
+        except tuple(ERRORS.values()) as error:
+            exchange['error'] = [name for name, cls in ERRORS.items() if isinstance(error, cls)][0]
+            self.write(exchange, sent)
+            raise
+        response_headers = dict(
+            (name, response.headers[name]) for name in HEADERS if name in response.headers
+        )
+        exchange.update(
+            status=response.status_code, headers=response_headers, response=content.decode('utf-8')
+        )
+        self.write(exchange, sent)
+        return Response(response.status_code, content, response_headers)
+
+    def write(self, exchange, sent):
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, 'wb')
+                self.started = sent
+            exchange['at'] = round(sent - self.started, 6)
+            exchange['latency'] = round(time.time() - sent, 6)
+            self._file.write((json.dumps(exchange, sort_keys=True) + "\n").encode('utf-8'))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayTransport(Transport):
+    """
+    Answers requests from a recording made by `RecordingTransport`. A
+    request is answered with a recorded response to the same url (ignoring
+    the api key) and body, in recorded order, or else with one to the same
+    url, and with status 404 if there is none. Responses take their
+    recorded latency multiplied by `time_scale` (0 to answer at once).
+    """
+
+    def __init__(self, path, time_scale=1.0):
+        self.time_scale = time_scale
+        self.exchanges = load(path)
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._by_request = defaultdict(deque)
+        self._by_url = defaultdict(deque)
+        for exchange in self.exchanges:
+            self._by_request[self.key(exchange['url'], exchange['request'])].append(exchange)
+            self._by_url[exchange['url']].append(exchange)
+
+    @staticmethod
+    def key(url, body):
+        return url, hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+    def find(self, url, body):
+        """
+        The recorded exchange answering a request, cycling through the
+        recorded exchanges for the same request when it is sent repeatedly
+        """
+        with self._lock:
+            for candidates in (self._by_request.get(self.key(url, body)), self._by_url.get(url)):
+                if candidates:
+                    candidates.rotate(-1)
+                    return candidates[-1]
+            self.misses += 1
+            return None
+
+    def post(self, url, data, headers, timeout=None, stream=False):
+        url = redact(url)
+        exchange = self.find(url, decoded_body(data, headers).decode('utf-8'))
+        if exchange is None:
+            return Response(404, json.dumps({'error': "No recorded response for %s" % url}).encode('utf-8'))
+
+        delay = exchange['latency'] * self.time_scale
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0))
+            raise requests.Timeout("Recorded response took longer than %s seconds" % timeout)
+        if delay:
+            time.sleep(delay)
+        if 'error' in exchange:
+            raise ERRORS[exchange['error']]("Recorded %s" % exchange['error'])
+        return Response(exchange['status'], exchange['response'].encode('utf-8'), exchange['headers'])
@@ -0,0 +1,85 @@
+"""
+Retries requests that failed transiently, with exponential backoff and full jitter
+"""
+import random
+import time
+
+import requests
+
+from indicoio.utils.errors import RetryableError, DeadlineExceededError
+
+
+class RetryPolicy(object):
+    """
+    Up to `max_attempts` attempts per request. Before attempt `n + 1` the
+    client waits a random time between 0 and `backoff * 2 ** (n - 1)` seconds
+    (capped at `max_backoff`), or at least as long as the server asked for
+    with a `Retry-After` header.
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30.0, retry_on=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on or (
+            RetryableError, requests.ConnectionError, requests.Timeout
+        )
+
+    def next_delay(self, attempt, error=None):
+        """
+        Seconds to wait after failed attempt number `attempt`, or None if
+        the request should not be retried.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, fn, *args, **kwargs):
+        """
+        `fn(*args)`, retried. Pass `deadline`, a `time.time()` timestamp, to
+        give up instead of waiting for a retry past it.
+        """
+        deadline = kwargs.get('deadline')
+        attempt = 1
+        while True:
+            try:
+                return fn(*args)
+            except self.retry_on as error:
+                delay = self.next_delay(attempt, error)
+                if delay is None:
+                    raise
+                check_deadline(deadline, delay, error)
+            time.sleep(delay)
+            attempt += 1
+
+
+def check_deadline(deadline, delay=0, error=None):
+    """
+    Raise `DeadlineExceededError` if `deadline` passes within `delay` seconds
+    """
+    if deadline is not None and time.time() + delay >= deadline:
+        raise DeadlineExceededError(
+            "Deadline exceeded" + (" after: %s" % error if error is not None else "")
+        )
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+RETRY_POLICY = RetryPolicy()
+
+
+def set_retry_policy(policy):
+    """
+    Set the default `RetryPolicy`. Pass `retry=` to an api call to override it for that call.
+    """
+    global RETRY_POLICY
+    RETRY_POLICY = policy or NO_RETRY
+
+
+def get_policy(retry=None):
+    if retry is False:
+        return NO_RETRY
+    return retry or RETRY_POLICY
@@ -0,0 +1,211 @@
+"""
+Spreads requests over several weighted endpoints, failing over between them
+"""
+import random
+import threading
+import time
+
+from six import string_types
+
+from indicoio import config
+from indicoio.utils.errors import CircuitOpenError, UnsupportedAPIError, is_overload
+from indicoio.utils.stats import STATS
+
+
+class Endpoint(object):
+    """
+    A private cloud, by name, or the public API (`config.PUBLIC_ENDPOINT`),
+    with a routing weight. Endpoints of weight 0 are only used for failover.
+    """
+
+    def __init__(self, name, weight=1.0):
+        self.name = name
+        self.weight = float(weight)
+
+    @property
+    def cloud(self):
+        return None if self.name == config.PUBLIC_ENDPOINT else self.name
+
+    @property
+    def host(self):
+        if self.name == config.PUBLIC_ENDPOINT:
+            return config.PUBLIC_API_HOST
+        return "%s.indico.domains" % self.name
+
+    def __repr__(self):
+        return "Endpoint(%r, %r)" % (self.name, self.weight)
+
+
+class EndpointPool(object):
+    """
+    Routes every request to one of `endpoints`, picked at random in
+    proportion to its weight, scaled down for endpoints that are slower
+    than the fastest one for the same api or that recently failed.
+
+    An endpoint is marked down for `cooldown` seconds after `max_failures`
+    overload failures in a row (retryable statuses, connection errors or
+    timeouts). A request that fails that way, hits an open circuit or an
+    endpoint without its api is sent again right away to the next endpoint,
+    then to the standby endpoints of weight 0. Down endpoints are only tried
+    when no other endpoint is left.
+
+    Configured in `.indicorc` or with `INDICO_CLOUD`, e.g.
+    `INDICO_CLOUD="east=3,west=1,public=0"`, or with `set_endpoints`.
+    Custom collections live on a single deployment, so their requests
+    always go to the first endpoint.
+    """
+
+    def __init__(self, endpoints, max_failures=3, cooldown=30.0, smoothing=0.2):
+        self.endpoints = [
+            endpoint if isinstance(endpoint, Endpoint) else Endpoint(*endpoint)
+            for endpoint in endpoints
+        ]
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._latencies = {}
+
+    def _health(self, host):
+        health = self._hosts.get(host)
+        if health is None:
+            health = self._hosts[host] = {'failures': 0, 'error_rate': 0.0, 'down_until': None}
+        return health
+
+    def primary(self):
+        return self.endpoints[0]
+
+    def observe(self, host, api, items, nbytes, latency, error=None, batch=False):
+        failed = is_overload(error)
+        with self._lock:
+            health = self._health(host)
+            health['error_rate'] += self.smoothing * ((1.0 if failed else 0.0) - health['error_rate'])
+            if failed:
+                health['failures'] += 1
+                if health['failures'] >= self.max_failures:
+                    health['down_until'] = time.time() + self.cooldown
+            else:
+                health['failures'] = 0
+                health['down_until'] = None
+                previous = self._latencies.get((host, api))
+                value = latency / max(items, 1)
+                self._latencies[(host, api)] = value if previous is None else (
+                    previous + self.smoothing * (value - previous)
+                )
+
+    def __call__(self, *args, **kwargs):
+        self.observe(*args, **kwargs)
+
+    def is_down(self, endpoint):
+        down_until = self._health(endpoint.host)['down_until']
+        return down_until is not None and down_until > time.time()
+
+    def effective_weight(self, endpoint, api):
+        latencies = [
+            self._latencies[(e.host, api)] for e in self.endpoints if (e.host, api) in self._latencies
+        ]
+        latency = self._latencies.get((endpoint.host, api))
+        weight = endpoint.weight * (1 - self._health(endpoint.host)['error_rate'])
+        if latency and latencies:
+            weight *= min(latencies) / latency
+        return weight
+
+    def candidates(self, api):
+        """
+        Endpoints to try for a request to `api`, in order
+        """
+        with self._lock:
+            weighted, standby, down = [], [], []
+            for endpoint in self.endpoints:
+                if self.is_down(endpoint):
+                    down.append(endpoint)
+                elif endpoint.weight > 0:
+                    weighted.append((self.effective_weight(endpoint, api), endpoint))
+                else:
+                    standby.append(endpoint)
+
+        ordered = []
+        while weighted:
+            total = sum(weight for weight, _ in weighted)
+            pick = random.uniform(0, total)
+            for idx, (weight, endpoint) in enumerate(weighted):
+                pick -= weight
+                if pick <= 0 or idx == len(weighted) - 1:
+                    break
+            ordered.append(weighted.pop(idx)[1])
+        ordered.extend(standby)
+        return ordered or down
+
+    def call(self, send, request, chunk):
+        """
+        `send(request, chunk)` to the best endpoint, failing over to the
+        others on overload errors
+        """
+        error = None
+        for endpoint in self.candidates(request.api):
+            try:
+                return send(request.routed_to(endpoint), chunk)
+            except Exception as failure:
+                if not fails_over(failure):
+                    raise
+                error = failure
+        raise error
+
+    def states(self):
+        """
+        Health of every endpoint
+        """
+        with self._lock:
+            return dict(
+                (endpoint.name, {
+                    'host': endpoint.host,
+                    'weight': endpoint.weight,
+                    'down': self.is_down(endpoint),
+                    'error_rate': self._health(endpoint.host)['error_rate']
+                })
+                for endpoint in self.endpoints
+            )
+
+
+def fails_over(error):
+    """
+    Whether a request that failed with `error` should be sent to another endpoint
+    """
+    return is_overload(error) or isinstance(error, (CircuitOpenError, UnsupportedAPIError))
+
+
+POOL = None
+_CONFIGURED = False
+
+
+def set_endpoints(endpoints, **kwargs):
+    """
+    Route requests over `endpoints`: an `EndpointPool`, a list of
+    `(name, weight)` pairs, or a string such as "east=3,west=1,public=0".
+    Pass None to send every request to `config.cloud` again. Extra keyword
+    arguments are passed to `EndpointPool`. Returns the previous pool.
+    """
+    global POOL, _CONFIGURED
+    previous = POOL
+    if previous is not None:
+        STATS.unsubscribe(previous)
+    if isinstance(endpoints, string_types):
+        endpoints = config.parse_endpoints(endpoints)
+    if endpoints is not None and not isinstance(endpoints, EndpointPool):
+        endpoints = EndpointPool(endpoints, **kwargs)
+    POOL = endpoints
+    _CONFIGURED = True
+    if endpoints is not None:
+        STATS.subscribe(endpoints)
+    return previous
+
+
+def get_pool():
+    """
+    The active `EndpointPool`, set up from the configured endpoints on
+    first use when several are configured
+    """
+    if POOL is None and not _CONFIGURED and len(config.endpoints) > 1:
+        set_endpoints(config.endpoints)
+    return POOL
@@ -0,0 +1,113 @@
+"""
+Pooled, keep-alive HTTP sessions used to talk to the IndicoApi Server
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from indicoio import config
+
+
+class SessionPool(object):
+    """
+    Thread-safe registry holding one `requests.Session` per host, so that
+    consecutive calls reuse open connections instead of paying for a new
+    TCP + TLS handshake each time.
+
+    Sessions are dropped (not closed) in a child process after `fork()`,
+    since sockets inherited from the parent must not be shared.
+    """
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+        self.host_pool_sizes = {}
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._pid = os.getpid()
+
+    def configure(self, pool_size, host=None):
+        """
+        Set the maximum number of keep-alive connections kept open per host.
+        If `host` is given, only that host is affected. Existing sessions
+        for the affected hosts are rebuilt on next use.
+        """
+        with self._lock:
+            if host:
+                self.host_pool_sizes[host] = pool_size
+                stale = [host]
+            else:
+                self.pool_size = pool_size
+                stale = [h for h in self._sessions if h not in self.host_pool_sizes]
+            for h in stale:
+                session = self._sessions.pop(h, None)
+                if session is not None:
+                    session.close()
+
+    def get_pool_size(self, host):
+        return (
+            self.host_pool_sizes.get(host) or
+            self.pool_size or
+            config.pool_size
+        )
+
+    def get(self, host):
+        """
+        Return the shared session for `host`, creating it if needed.
+        """
+        self._check_pid()
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._create(host)
+                self._sessions[host] = session
+            return session
+
+    def close(self):
+        """
+        Close every open session and its pooled connections.
+        """
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+
+    def _create(self, host):
+        pool_size = self.get_pool_size(host)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+
+SESSIONS = SessionPool()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=SESSIONS.reset_after_fork)
+
+
+def get_session(host):
+    return SESSIONS.get(host)
+
+
+def set_pool_size(pool_size, host=None):
+    """
+    Configure the connection pool size, either globally or for a single host
+    such as `config.PUBLIC_API_HOST` or `"<cloud>.indico.domains"`.
+    """
+    SESSIONS.configure(pool_size, host=host)
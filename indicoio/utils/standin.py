@@ -0,0 +1,222 @@
+"""
+A local stand-in for the IndicoApi Server, for tests and benchmarks run offline
+"""
+import json
+import random
+import threading
+import time
+import zlib
+
+import requests
+from six.moves import BaseHTTPServer, socketserver
+
+from indicoio.utils import codec
+from indicoio.utils.transport import Transport, Response, decoded_body, parse_url
+
+LABELS = {
+    'political': ['Libertarian', 'Green', 'Liberal', 'Conservative'],
+    'language': ['English', 'Spanish', 'French', 'German', 'Swedish'],
+    'texttags': ['startups_and_entrepreneurship', 'technology', 'sports', 'politics', 'music'],
+    'personality': ['openness', 'extraversion', 'agreeableness', 'conscientiousness'],
+    'fer': ['Angry', 'Sad', 'Neutral', 'Surprise', 'Fear', 'Happy'],
+    'imagerecognition': ['dog', 'cat', 'car', 'tree', 'person'],
+    'custom': ['positive', 'negative'],
+}
+
+VECTOR_SIZES = {'facialfeatures': 48, 'imagefeatures': 2048, 'textfeatures': 300}
+
+
+def distribution(rng, labels):
+    weights = [rng.random() for _ in labels]
+    total = sum(weights)
+    return dict((label, weight / total) for label, weight in zip(labels, weights))
+
+
+def words(item):
+    return [word.strip(".,!?").lower() for word in str(item).split() if word.strip(".,!?")]
+
+
+def fake_result(api, item, kwargs):
+    """
+    Deterministic fake result of `api` for one input `item`, shaped like
+    the real one
+    """
+    rng = random.Random(zlib.crc32(json.dumps([api, item], sort_keys=True).encode('utf-8')))
+    if api in LABELS:
+        return distribution(rng, LABELS[api])
+    if api in VECTOR_SIZES:
+        return [rng.random() for _ in range(VECTOR_SIZES[api])]
+    if api == 'keywords':
+        top = sorted(set(words(item)))[:kwargs.get('top_n') or 5]
+        return dict((word, rng.random()) for word in top)
+    if api in ('namedentities', 'people', 'places', 'organizations'):
+        text = str(item)
+        return [
+            {'text': word, 'confidence': rng.random(), 'position': [text.find(word), text.find(word) + len(word)]}
+            for word in text.split() if word[:1].isupper()
+        ]
+    if api == 'faciallocalization':
+        return [{'top_left_corner': [0, 0], 'bottom_right_corner': [48, 48]}]
+    if api == 'relevance':
+        return [rng.random() for _ in kwargs.get('queries') or [None]]
+    return rng.random()
+
+
+class StandInServer(Transport):
+    """
+    Answers requests built by `indicoio.utils.api.create_url`
+    (`/<api>/batch/<method>?key=&apis=&version=`) in process, with
+    deterministic fake results shaped like those of each api.
+
+    Every response takes `latency + latency_per_item * items` seconds.
+    `error_rate` of the requests, drawn from a generator seeded with
+    `seed`, fail with `error_status`, and requests over `max_items` inputs
+    or `max_bytes` of (uncompressed) body are rejected with status 413.
+    `requests`, `items` and `errors` count what the server received.
+
+    Use it as a transport (`indicoio.utils.transport.set_transport`), or
+    `serve()` it over HTTP on localhost.
+    """
+
+    def __init__(self, latency=0.0, latency_per_item=0.0, error_rate=0.0, error_status=503,
+                 max_items=None, max_bytes=None, seed=0):
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.requests = 0
+        self.items = 0
+        self.errors = 0
+        self.collections = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def respond(self, url, data, headers):
+        """
+        Returns the seconds to wait before answering a request, and the
+        `Response` to answer it with
+        """
+        api, batch, method, query = parse_url(url)
+        body = decoded_body(data, headers)
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            return self.error(self.error_status, "Service unavailable")
+        if self.max_bytes is not None and len(body) > self.max_bytes:
+            return self.error(413, "Request body larger than %d bytes" % self.max_bytes)
+
+        kwargs = codec.loads(body) if body else {}
+        items = kwargs.pop('data', None)
+        n_items = len(items) if batch and isinstance(items, list) else 1
+        if self.max_items is not None and n_items > self.max_items:
+            return self.error(413, "Batch larger than %d items" % self.max_items)
+        with self._lock:
+            self.items += n_items
+
+        if api == 'custom':
+            results = self.custom(method, items, kwargs, batch)
+        elif api.startswith('apis/'):
+            apis = query.get('apis', '').split(',')
+            results = dict(
+                (name, {'results': self.predict(name.replace('_', '').lower(), items, kwargs, batch)})
+                for name in apis if name
+            )
+        else:
+            results = self.predict(api, items, kwargs, batch)
+        delay = self.latency + self.latency_per_item * n_items
+        return delay, Response(200, codec.dumps({'results': results}),
+                               {'Content-Type': 'application/json'})
+
+    def error(self, status_code, message):
+        with self._lock:
+            self.errors += 1
+        return self.latency, Response(status_code, codec.dumps({'error': message}),
+                                      {'Content-Type': 'application/json'})
+
+    def predict(self, api, items, kwargs, batch):
+        if batch:
+            return [fake_result(api, item, kwargs) for item in items]
+        return fake_result(api, items, kwargs)
+
+    def custom(self, method, items, kwargs, batch):
+        name = kwargs.get('collection')
+        with self._lock:
+            if method == 'collections':
+                return dict(self.collections)
+            if method in ('add_data', 'train'):
+                self.collections.setdefault(name, {'status': 'ready', 'number_of_samples': 0})
+                if method == 'add_data':
+                    self.collections[name]['number_of_samples'] += len(items) if batch else 1
+                return True
+            if method == 'clear_collection':
+                self.collections.pop(name, None)
+                return True
+            if method == 'remove_example':
+                return True
+        return self.predict('custom', items, kwargs, batch)
+
+    def post(self, url, data, headers, timeout=None, stream=False):
+        delay, response = self.respond(url, data, headers)
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0))
+            raise requests.Timeout("Stand-in server did not respond within %s seconds" % timeout)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    def serve(self, port=0):
+        """
+        Serve over HTTP on 127.0.0.1 from a background thread, and return
+        the host to point `config.PUBLIC_API_HOST` at (with
+        `config.url_protocol = "http:"`)
+        """
+        self._httpd = HTTPServer(('127.0.0.1', port), RequestHandler)
+        self._httpd.standin = self
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return '127.0.0.1:%d' % self._httpd.server_address[1]
+
+    def shutdown(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+class HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        delay, response = self.server.standin.respond(self.path, self.read_body(), self.headers)
+        if delay:
+            time.sleep(delay)
+        self.send_response(response.status_code)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response.content)))
+        self.end_headers()
+        self.wfile.write(response.content)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+            return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        pieces = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+            if not size:
+                self.rfile.readline()
+                return b"".join(pieces)
+            pieces.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,110 @@
+"""
+Client side instrumentation: requests, latencies and payload sizes per endpoint
+"""
+import threading
+from collections import deque
+
+
+class EndpointStats(object):
+    """
+    Counters for one (host, api) endpoint, plus windows of recent latencies:
+    of all requests, of single-item requests, and of batch requests per item
+    """
+
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.errors = 0
+        self.items = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.circuit = None
+        self.latencies = deque(maxlen=window)
+        self.single_latencies = deque(maxlen=window)
+        self.item_latencies = deque(maxlen=window)
+
+    def percentile(self, q, latencies=None):
+        """
+        Latency, in seconds, below which `q` percent of recent requests
+        completed, or `q` percent of `latencies`, one of the other windows
+        """
+        latencies = sorted(self.latencies if latencies is None else latencies)
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * q / 100.), len(latencies) - 1)]
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'items': self.items,
+            'bytes_sent': self.bytes_sent,
+            'bytes_saved': self.bytes_saved,
+            'circuit': self.circuit,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99)
+        }
+
+
+class Stats(object):
+    """
+    Thread-safe registry of `EndpointStats`. Listeners subscribed with
+    `subscribe` are called with every recorded request.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def endpoint(self, host, api):
+        with self._lock:
+            stats = self._endpoints.get((host, api))
+            if stats is None:
+                stats = self._endpoints[(host, api)] = EndpointStats(self.window)
+            return stats
+
+    def record(self, host, api, items, nbytes, latency, error=None, batch=False, sent=None):
+        """
+        Record a request of `items` items and `nbytes` bytes that completed
+        (or failed with `error`) after `latency` seconds. `sent` is the size
+        actually sent when the body was compressed.
+        """
+        sent = nbytes if sent is None else sent
+        stats = self.endpoint(host, api)
+        with self._lock:
+            stats.requests += 1
+            stats.items += items
+            stats.bytes_sent += sent
+            stats.bytes_saved += nbytes - sent
+            if error is not None:
+                stats.errors += 1
+            else:
+                stats.latencies.append(latency)
+                if batch:
+                    stats.item_latencies.append(latency / max(items, 1))
+                else:
+                    stats.single_latencies.append(latency)
+        for listener in list(self.listeners):
+            listener(host, api, items, nbytes, latency, error, batch)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = list(self._endpoints.items())
+        return dict(
+            ("%s/%s" % (host, api), stats.snapshot()) for (host, api), stats in endpoints
+        )
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+
+STATS = Stats()
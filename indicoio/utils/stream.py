@@ -0,0 +1,98 @@
+"""
+Streams inputs of any size through the api with bounded memory
+"""
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import indicoio
+
+
+def imap(api, iterable, chunk_size=100, concurrency=4, ordered=True, **kwargs):
+    """
+    Lazily apply `api` to every element of `iterable`, which may be any
+    iterable or generator, and yield the results as they are available.
+
+    Inputs are pulled `chunk_size` at a time and sent as batch calls, with at
+    most `concurrency` chunks in flight, so memory use does not depend on the
+    length of `iterable`. Extra keyword arguments are passed to `api`.
+
+    Example usage:
+
+    .. code-block:: python
+
+       >>> import indicoio
+       >>> lines = (json.loads(line)['text'] for line in open('corpus.jsonl'))
+       >>> for score in indicoio.imap(indicoio.sentiment, lines, chunk_size=500):
+       ...     print(score)
+
+    :param api: An api function such as `indicoio.sentiment`, or its name.
+    :param ordered: If False, results are yielded as soon as their chunk
+        completes, as `(index, result)` pairs.
+    :rtype: Generator of results
+    """
+    chunks = imap_chunks(api, chunk_inputs(iterable, chunk_size), concurrency, ordered, **kwargs)
+    for start, results in chunks:
+        if ordered:
+            for result in results:
+                yield result
+        else:
+            for idx, result in enumerate(results, start):
+                yield idx, result
+
+
+def imap_chunks(api, chunks, concurrency=4, ordered=True, **kwargs):
+    """
+    Send every `(start, inputs)` pair of `chunks` as a batch call to `api`,
+    with at most `concurrency` in flight, and yield `(start, results)` pairs.
+    A `concurrency` below 1 sends one chunk at a time.
+    """
+    if not callable(api):
+        api = getattr(indicoio, api)
+
+    chunks = iter(chunks)
+    concurrency = max(concurrency, 1)
+    executor = ThreadPoolExecutor(concurrency)
+    pending = deque() if ordered else set()
+
+    def submit(start, chunk):
+        future = executor.submit(lambda: (start, api(chunk, **kwargs)))
+        if ordered:
+            pending.append(future)
+        else:
+            pending.add(future)
+
+    try:
+        for start, chunk in islice(chunks, concurrency):
+            submit(start, chunk)
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+
+            for future in done:
+                result = future.result()
+                for start, chunk in islice(chunks, 1):
+                    submit(start, chunk)
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def chunk_inputs(iterable, chunk_size):
+    """
+    Lazily split `iterable` into `(start, inputs)` pairs of `chunk_size` inputs
+    """
+    iterator = iter(iterable)
+    start = 0
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
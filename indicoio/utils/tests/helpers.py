@@ -0,0 +1,23 @@
+"""
+Responses for mocked sessions, shared by the utils tests
+"""
+import json
+
+from mock import MagicMock
+
+
+def make_response(status_code=200, results=None, headers=None):
+    response = MagicMock()
+    response.headers = headers or {}
+    response.status_code = status_code
+    response.content = json.dumps({'results': results}).encode('utf-8')
+    return response
+
+
+def echo_response(url, data=None, **kwargs):
+    """
+    `post` side effect answering every request with its own input data
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return make_response(200, json.loads(data)['data'])
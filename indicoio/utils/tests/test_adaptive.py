@@ -0,0 +1,58 @@
+import json
+
+from mock import patch, MagicMock
+
+from indicoio.utils.adaptive import AdaptiveController, set_controller
+from indicoio.utils.errors import IndicoError, RetryableError
+from indicoio.utils.stats import STATS
+from indicoio.utils.tests.helpers import echo_response
+
+
+def test_grows_towards_target_latency():
+    controller = AdaptiveController(target_latency=1.0, initial_size=10, max_size=500)
+    controller.observe('host', 'sentiment', 10, 1000, 0.01)
+    assert controller.batch_size('host', 'sentiment') == 20
+    assert controller.workers('host', 'sentiment') == 2
+
+    for _ in range(10):
+        size = controller.batch_size('host', 'sentiment')
+        controller.observe('host', 'sentiment', size, 100 * size, 0.001 * size)
+    assert controller.batch_size('host', 'sentiment') == 500
+
+
+def test_endpoints_are_independent():
+    controller = AdaptiveController(target_latency=1.0, initial_size=40)
+    controller.observe('host', 'sentiment', 40, 4000, 0.1)
+    controller.observe('host', 'image_features', 40, 4000000, 4.0)
+    assert controller.batch_size('host', 'sentiment') > 40
+    assert controller.batch_size('host', 'image_features') == 20
+    assert set(controller.decisions()) == {'host/sentiment', 'host/image_features'}
+
+
+def test_backs_off_on_overload_only():
+    controller = AdaptiveController(initial_size=40, initial_workers=4)
+    controller.observe('host', 'sentiment', 40, 4000, 0.1, error=IndicoError("bad input"))
+    assert controller.batch_size('host', 'sentiment') == 40
+
+    controller.observe('host', 'sentiment', 40, 4000, 0.1, error=RetryableError("busy", 503))
+    assert controller.batch_size('host', 'sentiment') == 20
+    assert controller.workers('host', 'sentiment') == 2
+    assert controller.decisions()['host/sentiment']['reason'] == 'overload: RetryableError'
+    assert controller.history[-1]['batch_size'] == 20
+
+
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_uses_controller(mock_get_session):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    controller = AdaptiveController(initial_size=3, max_workers=1)
+    set_controller(controller)
+    try:
+        assert sentiment(["text %d" % i for i in range(10)]) == ["text %d" % i for i in range(10)]
+    finally:
+        set_controller(None)
+
+    sizes = [len(json.loads(call[1]['data'])['data']) for call in mock_get_session.return_value.post.call_args_list]
+    assert sizes == [3, 3, 3, 1]
+    assert len(controller.decisions()) == 1
+    assert controller not in STATS.listeners
@@ -0,0 +1,178 @@
+import json
+
+from mock import patch, MagicMock
+
+from indicoio.utils.batch import chunk_ranges, merge_results, batch_limits
+from indicoio.utils.tests.helpers import echo_response, make_response
+
+
+def test_chunk_ranges_by_count():
+    assert chunk_ranges([1] * 5, 2, 100) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_chunk_ranges_by_bytes():
+    assert chunk_ranges([4, 4, 4, 10, 1], 100, 8) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+
+
+def test_chunk_ranges_empty():
+    assert chunk_ranges([], 10, 10) == [(0, 0)]
+
+
+def test_batch_limits_overrides():
+    default_size, default_bytes = batch_limits('imagefeatures')
+    assert batch_limits('imagefeatures', batch_size=3) == (3, default_bytes)
+    assert batch_limits('unknown_api') == batch_limits('default')
+
+
+def test_merge_results():
+    assert merge_results([[1, 2], [3], [4]]) == [1, 2, 3, 4]
+    multi = merge_results([
+        {'sentiment': {'results': [0.1]}, 'language': {'results': ['a']}},
+        {'sentiment': {'results': [0.2]}, 'language': {'error': 'oops'}},
+    ])
+    assert multi['sentiment'] == {'results': [0.1, 0.2]}
+    assert multi['language'] == {'error': 'oops'}
+
+
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_chunks_batches(mock_get_session):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    data = ['text %d' % i for i in range(10)]
+    assert sentiment(data, batch_size=3, top_n=2) == data
+    assert mock_get_session.return_value.post.call_count == 4
+    body = json.loads(mock_get_session.return_value.post.call_args[1]['data'])
+    assert body == {'data': ['text 9'], 'top_n': 2}
+
+
+def test_dispatch_preserves_order():
+    import time, random
+    from indicoio.utils.batch import dispatch
+
+    def slow_square(x):
+        time.sleep(random.random() / 100)
+        return x * x
+
+    assert dispatch(slow_square, list(range(20)), max_workers=8) == [x * x for x in range(20)]
+
+
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_parallel_chunks(mock_get_session):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    data = ['text %d' % i for i in range(50)]
+    assert sentiment(data, batch_size=4, max_workers=5) == data
+    assert mock_get_session.return_value.post.call_count == 13
+
+
+def failing_response(url, data=None, **kwargs):
+    items = json.loads(data)['data']
+    response = MagicMock()
+    response.headers = {}
+    response.status_code = 200
+    if any(item.startswith('bad') for item in items):
+        response.content = json.dumps({'error': 'bad input'}).encode('utf-8')
+    else:
+        response.content = json.dumps({'results': items}).encode('utf-8')
+    return response
+
+
+@patch('indicoio.utils.api.get_session')
+def test_isolate_errors(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.errors import IndicoError
+    post = mock_get_session.return_value.post = MagicMock(side_effect=failing_response)
+    data = ['ok 0', 'ok 1', 'bad 2', 'ok 3', 'ok 4', 'ok 5', 'ok 6', 'bad 7']
+    results = sentiment(data, batch_size=4, isolate_errors=True)
+
+    assert [idx for idx, _ in results.errors] == [2, 7]
+    assert isinstance(results[2], IndicoError)
+    assert [r for r in results if not isinstance(r, IndicoError)] == [
+        d for d in data if d.startswith('ok')
+    ]
+    assert results.extra_requests == post.call_count - 2
+
+
+@patch('indicoio.utils.api.get_session')
+def test_isolate_errors_raises_overload(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.errors import RetryableError
+    post = mock_get_session.return_value.post = MagicMock(return_value=make_response(429))
+    data = ['ok %d' % i for i in range(64)]
+    try:
+        sentiment(data, batch_size=64, isolate_errors=True, retry=False)
+    except RetryableError:
+        pass
+    else:
+        assert False, "expected RetryableError"
+    assert post.call_count == 1
+
+
+@patch('indicoio.utils.api.get_session')
+def test_isolate_errors_raises_request_errors(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.errors import RequestError
+    response = make_response(401)
+    response.content = json.dumps({'error': 'Invalid API key'}).encode('utf-8')
+    post = mock_get_session.return_value.post = MagicMock(return_value=response)
+    try:
+        sentiment(['text %d' % i for i in range(1000)], isolate_errors=True)
+    except RequestError as error:
+        assert str(error) == 'Invalid API key'
+        assert error.status_code == 401
+    else:
+        assert False, "expected RequestError"
+    assert post.call_count == 1
+
+
+@patch('indicoio.utils.api.get_session')
+def test_isolate_errors_stops_when_halves_fail_alike(mock_get_session):
+    from indicoio import sentiment
+    response = make_response(400)
+    response.content = json.dumps({'error': 'unknown argument'}).encode('utf-8')
+    post = mock_get_session.return_value.post = MagicMock(return_value=response)
+    results = sentiment(['text %d' % i for i in range(1000)], isolate_errors=True, batch_size=1000)
+    assert len(results.errors) == 1000
+    assert post.call_count == 3
+    assert results.extra_requests == 2
+
+
+@patch('indicoio.utils.api.get_session')
+def test_errors_raised_without_isolation(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.errors import IndicoError
+    mock_get_session.return_value.post = MagicMock(side_effect=failing_response)
+    try:
+        sentiment(['ok', 'bad'])
+    except IndicoError:
+        pass
+    else:
+        assert False, "expected IndicoError"
+
+
+@patch('indicoio.utils.api.get_session')
+def test_streamed_body_encodes_items_lazily(mock_get_session):
+    from indicoio.utils.api import api_handler
+    from indicoio.utils.batch import LazyItems
+    preprocessed = []
+
+    def preprocess(item):
+        preprocessed.append(item)
+        return item.upper()
+
+    def streaming_post(url, data=None, **kwargs):
+        assert not isinstance(data, bytes)
+        before, body = len(preprocessed), b""
+        for piece in data:
+            body += piece
+            # every item is preprocessed only as its piece of the body is sent
+            assert len(preprocessed) - before == max(body.count(b'"') // 2 - 1, 0)
+        return echo_response(url, body)
+
+    mock_get_session.return_value.post = MagicMock(side_effect=streaming_post)
+    items = LazyItems(['a', 'b', 'c', 'd', 'e'], preprocess)
+    results = api_handler(
+        items, None, "imagefeatures", {"batch": True}, stream_body=True, batch_size=2
+    )
+    assert results == ['A', 'B', 'C', 'D', 'E']
+    assert mock_get_session.return_value.post.call_count == 3
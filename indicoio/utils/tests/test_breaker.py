@@ -0,0 +1,82 @@
+import pytest
+import requests
+from mock import patch, MagicMock
+
+from indicoio.utils.breaker import CircuitBreaker, set_circuit_breaker
+from indicoio.utils.errors import IndicoError, RetryableError, CircuitOpenError
+from indicoio.utils.stats import STATS
+from indicoio.utils.tests.helpers import make_response
+
+
+def test_opens_on_failure_rate():
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=4)
+    for error in [None, IndicoError("bad input"), None]:
+        breaker.before('host', 'sentiment')
+        breaker.observe('host', 'sentiment', 1, 10, 0.1, error)
+    breaker.before('host', 'sentiment')
+    breaker.observe('host', 'sentiment', 1, 10, 0.1, RetryableError("busy", 503))
+    assert breaker.states()['host/sentiment']['state'] == 'closed'
+
+    breaker.observe('host', 'sentiment', 1, 10, 0.1, requests.ConnectionError())
+    assert breaker.states()['host/sentiment']['state'] == 'closed'
+    breaker.observe('host', 'sentiment', 1, 10, 0.1, requests.Timeout())
+    assert breaker.states()['host/sentiment'] == {'state': 'open', 'failure_rate': 0.5}
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before('host', 'sentiment')
+    assert error.value.retry_after > 0
+    breaker.before('host', 'language')
+
+
+@patch('indicoio.utils.breaker.time.time')
+def test_half_open_probes(mock_time):
+    mock_time.return_value = 1000.0
+    breaker = CircuitBreaker(min_requests=1, reset_timeout=10)
+    breaker.observe('host', 'sentiment', 1, 10, 0.1, RetryableError("busy", 503))
+
+    mock_time.return_value = 1011.0
+    breaker.before('host', 'sentiment')
+    with pytest.raises(CircuitOpenError):
+        breaker.before('host', 'sentiment')
+    breaker.observe('host', 'sentiment', 1, 10, 0.1, RetryableError("busy", 503))
+    assert breaker.states()['host/sentiment']['state'] == 'open'
+
+    mock_time.return_value = 1022.0
+    breaker.before('host', 'sentiment')
+    breaker.observe('host', 'sentiment', 1, 10, 0.1)
+    assert breaker.states()['host/sentiment'] == {'state': 'closed', 'failure_rate': 0.0}
+
+
+@patch('indicoio.utils.breaker.time.time')
+def test_abandoned_trial_expires(mock_time):
+    mock_time.return_value = 1000.0
+    breaker = CircuitBreaker(min_requests=1, reset_timeout=10)
+    breaker.observe('host', 'sentiment', 1, 10, 0.1, RetryableError("busy", 503))
+
+    mock_time.return_value = 1011.0
+    breaker.before('host', 'sentiment')
+    mock_time.return_value = 1020.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before('host', 'sentiment')
+    mock_time.return_value = 1021.0
+    breaker.before('host', 'sentiment')
+    breaker.observe('host', 'sentiment', 1, 10, 0.1)
+    assert breaker.states()['host/sentiment']['state'] == 'closed'
+
+
+@patch('indicoio.utils.retry.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_fails_fast(mock_get_session, _):
+    from indicoio import config, sentiment
+    mock_get_session.return_value.post = MagicMock(return_value=make_response(503))
+    set_circuit_breaker(CircuitBreaker(min_requests=3))
+    try:
+        with pytest.raises(RetryableError):
+            sentiment("text")
+        assert mock_get_session.return_value.post.call_count == 3
+
+        with pytest.raises(CircuitOpenError):
+            sentiment(["text %d" % i for i in range(4)], isolate_errors=True)
+        assert mock_get_session.return_value.post.call_count == 3
+        assert STATS.snapshot()[config.PUBLIC_API_HOST + '/sentiment']['circuit'] == 'open'
+    finally:
+        set_circuit_breaker(None)
@@ -0,0 +1,167 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from mock import patch, MagicMock
+
+from indicoio.utils.cache import MemoryCache, DiskCache, MISSING, set_cache
+from indicoio.utils.tests.helpers import echo_response
+
+
+def test_lru_eviction():
+    cache = MemoryCache(max_items=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_byte_bound():
+    cache = MemoryCache(max_bytes=10)
+    cache.set('a', [1, 2])
+    cache.set('b', [3, 4])
+    assert cache.get('a') is MISSING
+    assert cache.stats()['bytes'] <= 10
+
+
+@patch('indicoio.utils.cache.time.time')
+def test_ttl(mock_time):
+    mock_time.return_value = 100
+    cache = MemoryCache(ttl=10)
+    cache.set('a', 0.0)
+    assert cache.get('a') == 0.0
+    mock_time.return_value = 111
+    assert cache.get('a') is MISSING
+    assert cache.stats()['hits'] == 1
+
+
+class TestDiskCache(object):
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def test_persisted(self):
+        DiskCache(self.path).set('a', {'result': [1, 2]})
+        cache = DiskCache(self.path)
+        assert cache.get('a') == {'result': [1, 2]}
+        assert cache.get('b') is MISSING
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_size_cap_evicts_least_recently_used(self):
+        cache = DiskCache(self.path, max_bytes=20)
+        cache.set('a', 'x' * 5)
+        cache.set('b', 'y' * 5)
+        cache.get('a')
+        cache.set('c', 'z' * 5)
+        assert cache.get('b') is MISSING
+        assert cache.get('a') == 'x' * 5
+        assert cache.stats()['bytes'] <= 20
+
+    @patch('indicoio.utils.cache.time.time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 100
+        cache = DiskCache(self.path, ttl=10)
+        cache.set('a', 1)
+        mock_time.return_value = 111
+        assert cache.get('a') is MISSING
+
+    def test_set_many(self):
+        cache = DiskCache(self.path, max_bytes=21, ttl=60)
+        cache.set_many([('a', 'x' * 5), ('b', 'y' * 5), ('c', 'z' * 5)])
+        assert [cache.get(key) for key in 'abc'] == ['x' * 5, 'y' * 5, 'z' * 5]
+        cache.set_many([('d', 'w' * 5)])
+        assert cache.get('a') is MISSING
+        assert cache.stats()['bytes'] <= 21
+        indexes = cache._connection().execute("PRAGMA index_list(entries)").fetchall()
+        assert 'entries_created' in [index[1] for index in indexes]
+
+    def test_database_errors_are_misses(self):
+        cache = DiskCache(self.path, timeout=0.05)
+        cache.set('a', 1)
+        other = sqlite3.connect(self.path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        try:
+            cache.set('b', 2)
+        finally:
+            other.execute("ROLLBACK")
+        assert cache.get('b') is MISSING
+
+        with patch.object(cache, '_connection', side_effect=sqlite3.OperationalError("database is locked")):
+            assert cache.get('a') is MISSING
+            cache.set('c', 3)
+        assert cache.get('a') == 1
+
+    def test_concurrent_processes(self):
+        processes = [
+            multiprocessing.Process(target=fill_cache, args=(self.path, i))
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+
+        cache = DiskCache(self.path)
+        assert cache.stats()['entries'] == 200
+        assert cache.get('3-49') == 49
+
+
+def fill_cache(path, worker):
+    cache = DiskCache(path)
+    for i in range(50):
+        cache.set('%d-%d' % (worker, i), i)
+
+
+@patch('indicoio.utils.api.get_session')
+def test_batch_sends_only_misses(mock_get_session):
+    from indicoio import keywords
+    post = mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    set_cache(MemoryCache())
+    try:
+        assert keywords('b', top_n=3) == 'b'
+        assert keywords(['a', 'b', 'c'], top_n=3) == ['a', 'b', 'c']
+        assert json.loads(post.call_args[1]['data'])['data'] == ['a', 'c']
+        assert keywords(['c', 'b', 'a'], top_n=3) == ['c', 'b', 'a']
+        assert post.call_count == 2
+
+        keywords(['a'], top_n=5)
+        assert post.call_count == 3
+    finally:
+        set_cache(None)
+
+
+def test_results_copied_in_and_out():
+    cache = MemoryCache()
+    value = {'Green': 0.5}
+    cache.set('key', value)
+    value['Green'] = 99
+    cache.get('key')['Green'] = 99
+    assert cache.get('key') == {'Green': 0.5}
+
+
+@patch('indicoio.utils.api.get_session')
+def test_all_hits_keep_batch_result(mock_get_session):
+    from indicoio import keywords
+    mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    set_cache(MemoryCache())
+    try:
+        keywords(['a', 'b'], top_n=3, isolate_errors=True)
+        results = keywords(['a', 'b'], top_n=3, isolate_errors=True)
+        assert mock_get_session.return_value.post.call_count == 1
+        assert results == ['a', 'b']
+        assert results.errors == []
+        assert results.extra_requests == 0
+    finally:
+        set_cache(None)
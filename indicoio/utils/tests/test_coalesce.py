@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+
+from mock import patch, MagicMock
+
+from indicoio.utils.coalesce import Coalescer, enable_coalescing, disable_coalescing
+from indicoio.utils.tests.helpers import echo_response, make_response
+
+
+def test_coalescer_groups_concurrent_items():
+    coalescer = Coalescer(max_delay=0.2, max_items=10)
+    sent = []
+
+    def send(items):
+        sent.append(list(items))
+        return [item * 2 for item in items]
+
+    results = {}
+
+    def submit(i):
+        results[i] = coalescer.submit('key', i, send)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == dict((i, i * 2) for i in range(10))
+    assert len(sent) == 1
+
+
+def test_coalescer_propagates_errors():
+    coalescer = Coalescer(max_delay=0, max_items=10)
+
+    def send(items):
+        raise ValueError("batch failed")
+
+    try:
+        coalescer.submit('key', 1, send)
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
+
+
+@patch('indicoio.utils.api.get_session')
+def test_single_calls_sent_as_batch(mock_get_session):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    enable_coalescing(max_delay=0.2, max_items=8)
+    try:
+        results = {}
+
+        def call(i):
+            results[i] = sentiment('text %d' % i)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        disable_coalescing()
+
+    assert results == dict((i, 'text %d' % i) for i in range(8))
+    assert post.call_count == 1
+    assert '/sentiment/batch' in post.call_args[0][0]
+
+
+@patch('indicoio.utils.api.get_session')
+def test_coalesced_calls_keep_retry_option(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.api import APIRequest
+    from indicoio.utils.errors import RetryableError
+    post = mock_get_session.return_value.post = MagicMock(return_value=make_response(503))
+    key = APIRequest('text', None, 'sentiment', {}).coalesce_key()
+    assert APIRequest('text', None, 'sentiment', {}, retry=False).coalesce_key() != key
+    assert APIRequest('text', None, 'sentiment', {}, hedge=True).coalesce_key() != key
+
+    enable_coalescing(max_delay=0.01, max_items=10)
+    try:
+        sentiment('text', retry=False)
+    except RetryableError:
+        pass
+    else:
+        assert False, "expected RetryableError"
+    finally:
+        disable_coalescing()
+    assert post.call_count == 1
+    assert '/sentiment/batch' in post.call_args[0][0]
+
+
+def slow_echo_response(url, data=None, **kwargs):
+    time.sleep(0.1)
+    return echo_response(url, data=data, **kwargs)
+
+
+@patch('indicoio.utils.api.get_session')
+def test_identical_calls_share_request(mock_get_session):
+    from indicoio import keywords
+    post = mock_get_session.return_value.post = MagicMock(side_effect=slow_echo_response)
+    results = []
+
+    def call():
+        results.append(keywords(['same text'], top_n=3))
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [['same text']] * 6
+    assert post.call_count == 1
+    assert results[0] is not results[1]
+
+
+@patch('indicoio.utils.api.get_session')
+def test_batch_duplicates_sent_once(mock_get_session):
+    from indicoio import text_tags
+    post = mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    data = ['a', 'b', 'a', 'c', 'b', 'a']
+    assert text_tags(data) == data
+    assert json.loads(post.call_args[1]['data'])['data'] == ['a', 'b', 'c']
+
+
+@patch('indicoio.utils.api.get_session')
+def test_batch_duplicates_get_copies(mock_get_session):
+    from indicoio import political
+    mock_get_session.return_value.post = MagicMock(return_value=make_response(200, [{'Green': 0.5}]))
+    results = political(['same', 'same'])
+    assert results == [{'Green': 0.5}, {'Green': 0.5}]
+    assert results[0] is not results[1]
+
+
+def test_calls_with_other_options_not_shared():
+    from indicoio.utils.api import APIRequest
+    key = APIRequest(['a', 'b'], None, 'sentiment', {'batch': True}).flight_key()
+    assert key == APIRequest(['a', 'b'], None, 'sentiment', {'batch': True}).flight_key()
+    for option in [{'isolate_errors': True}, {'retry': False}, {'hedge': True}, {'max_workers': 4}]:
+        assert APIRequest(['a', 'b'], None, 'sentiment', {'batch': True}, **option).flight_key() != key
+
+
+@patch('indicoio.utils.api.get_session')
+def test_isolating_call_not_shared_with_plain_call(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.batch import BatchResult
+    from indicoio.utils.errors import IndicoError
+
+    def slow_error(url, data=None, **kwargs):
+        time.sleep(0.1)
+        response = make_response(200)
+        response.content = json.dumps({'error': 'bad input'}).encode('utf-8')
+        return response
+
+    mock_get_session.return_value.post = MagicMock(side_effect=slow_error)
+    outcomes = {}
+
+    def call(name, **kwargs):
+        try:
+            outcomes[name] = sentiment(['bad', 'bad input'], **kwargs)
+        except IndicoError as error:
+            outcomes[name] = error
+
+    threads = [
+        threading.Thread(target=call, args=('plain',)),
+        threading.Thread(target=call, args=('isolated',), kwargs={'isolate_errors': True}),
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    assert isinstance(outcomes['plain'], IndicoError)
+    assert isinstance(outcomes['isolated'], BatchResult)
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+import requests
+from mock import patch, MagicMock
+
+from indicoio.utils import codec
+from indicoio.utils.api import encode_batch
+from indicoio.utils.codec import CODECS, set_codec, iter_results
+from indicoio.utils.errors import IndicoError
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_codecs_round_trip(name):
+    previous = set_codec(name)
+    try:
+        assert codec.CODEC.name == name
+        data = {'results': [[0.5, 1.0], {'word': 0.25}, u'caf\xe9']}
+        encoded = codec.dumps(data)
+        assert isinstance(encoded, bytes)
+        assert codec.loads(encoded) == data
+
+        body = encode_batch([codec.dumps(u'caf\xe9'), codec.dumps([1, 2])], {'top_n': 5})
+        assert json.loads(body.decode('utf-8')) == {'data': [u'caf\xe9', [1, 2]], 'top_n': 5}
+    finally:
+        set_codec(previous)
+
+
+def test_set_codec_rejects_unknown():
+    with pytest.raises(ValueError):
+        set_codec('yaml')
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 3, 64])
+def test_iter_results_across_chunk_boundaries(size):
+    results = [[0.125, 2.5e-3, -1], {u'caf\xe9': True}, 12345, None, u'text']
+    body = json.dumps({'version': 1, 'results': results}).encode('utf-8')
+    assert list(iter_results(split(body, size))) == results
+
+
+BODY = b'{"results": [0.5, 1.25, 3e5, -2E-3]}'
+
+
+@pytest.mark.parametrize('offset', range(1, len(BODY)))
+def test_iter_results_numbers_split_at_every_offset(offset):
+    assert list(iter_results([BODY[:offset], BODY[offset:]])) == [0.5, 1.25, 3e5, -2E-3]
+
+
+def test_iter_results_errors():
+    with pytest.raises(IndicoError) as error:
+        list(iter_results([b'{"error": "bad input"}']))
+    assert str(error.value) == "bad input"
+
+    with pytest.raises(IndicoError):
+        list(iter_results([b'{"results": [1, 2, 3']))
+
+
+def stream_response(url, data=None, **kwargs):
+    items = json.loads(data)['data']
+    response = MagicMock()
+    response.headers = {}
+    response.status_code = 200
+    body = json.dumps({'results': items}).encode('utf-8')
+    response.iter_content = MagicMock(return_value=iter(split(body, 5)))
+    return response
+
+
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_streams_results(mock_get_session):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=stream_response)
+    texts = ["text %d" % i for i in range(5)]
+    results = sentiment(texts, stream=True, batch_size=2)
+    assert not isinstance(results, list)
+    assert list(results) == texts
+    assert mock_get_session.return_value.post.call_count == 3
+
+    with pytest.raises(IndicoError):
+        sentiment("single text", stream=True)
+
+
+@patch('indicoio.utils.api.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_stream_resumes_after_dropped_connection(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+
+    def dropped(url, data=None, **kwargs):
+        response = stream_response(url, data)
+        body = b"".join(response.iter_content())
+
+        def chunks():
+            yield body[:body.index(b',') + 1]
+            raise requests.exceptions.ChunkedEncodingError()
+        response.iter_content = MagicMock(return_value=chunks())
+        return response
+
+    calls = []
+
+    def post(url, data=None, **kwargs):
+        calls.append(json.loads(data)['data'])
+        return (dropped if len(calls) == 1 else stream_response)(url, data)
+
+    mock_get_session.return_value.post = MagicMock(side_effect=post)
+    assert list(sentiment(["a", "b", "c"], stream=True)) == ["a", "b", "c"]
+    assert calls == [["a", "b", "c"], ["b", "c"]]
+    assert mock_sleep.call_count == 1
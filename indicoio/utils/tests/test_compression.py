@@ -0,0 +1,65 @@
+import json
+import zlib
+
+from mock import patch, MagicMock
+
+from indicoio import config, JSON_HEADERS
+from indicoio.utils.compression import encode_body, set_compression
+from indicoio.utils.stats import STATS
+from indicoio.utils.tests.helpers import echo_response
+
+
+def gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def gzip_echo_response(url, data=None, headers=None, **kwargs):
+    assert headers['Content-Encoding'] == 'gzip'
+    return echo_response(url, gunzip(data))
+
+
+def test_encode_body_threshold():
+    body = json.dumps({'data': ["the same text"] * 100}).encode('utf-8')
+    previous = config.gzip_min_bytes
+    try:
+        set_compression(None)
+        assert encode_body(body) == (body, JSON_HEADERS)
+
+        set_compression(len(body) + 1)
+        assert encode_body(body)[1] == JSON_HEADERS
+
+        set_compression(len(body), level=9)
+        data, headers = encode_body(body)
+        assert headers['Content-Encoding'] == 'gzip'
+        assert len(data) < len(body)
+        assert gunzip(data) == body
+    finally:
+        set_compression(previous, level=config.DEFAULT_GZIP_LEVEL)
+
+
+def test_encode_body_skips_incompressible():
+    previous = config.gzip_min_bytes
+    try:
+        set_compression(1)
+        assert encode_body(b'{"data": 1}') == (b'{"data": 1}', JSON_HEADERS)
+    finally:
+        set_compression(previous)
+
+
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_reports_savings(mock_get_session):
+    from indicoio import keywords
+    mock_get_session.return_value.post = MagicMock(side_effect=gzip_echo_response)
+    texts = ["a long and rather repetitive document " * 50] * 3
+    previous = config.gzip_min_bytes
+    STATS.reset()
+    try:
+        set_compression(1024)
+        assert keywords(["%d %s" % (i, text) for i, text in enumerate(texts)]) == [
+            "%d %s" % (i, text) for i, text in enumerate(texts)
+        ]
+    finally:
+        set_compression(previous)
+
+    stats = STATS.snapshot()[config.PUBLIC_API_HOST + '/keywords']
+    assert stats['bytes_saved'] > stats['bytes_sent'] > 0
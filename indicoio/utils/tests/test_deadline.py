@@ -0,0 +1,119 @@
+import time
+
+import pytest
+import requests
+from mock import patch
+
+from indicoio import config
+from indicoio.utils.errors import DeadlineExceededError
+from indicoio.utils.tests.helpers import echo_response, make_response
+
+
+def slow_post(latency):
+    def post(url, data=None, timeout=None, **kwargs):
+        if timeout is not None and timeout < latency:
+            time.sleep(max(timeout, 0))
+            raise requests.Timeout()
+        time.sleep(latency)
+        return echo_response(url, data)
+    return post
+
+
+@patch('indicoio.utils.api.get_session')
+def test_timeout_is_passed_and_capped_by_deadline(mock_get_session):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post
+    post.return_value = make_response(200, 0.5)
+
+    sentiment("text")
+    assert post.call_args[1]['timeout'] is None
+
+    sentiment("text", timeout=5)
+    assert post.call_args[1]['timeout'] == 5
+
+    previous, config.timeout = config.timeout, 10
+    try:
+        sentiment("text", deadline=2)
+        assert 1.9 < post.call_args[1]['timeout'] <= 2
+        sentiment("text", timeout=1, deadline=2)
+        assert post.call_args[1]['timeout'] == 1
+    finally:
+        config.timeout = previous
+
+
+def test_bounded_calls_not_shared():
+    from indicoio.utils.api import APIRequest
+    assert APIRequest("text", None, 'sentiment', {}).coalesce_key() is not None
+    assert APIRequest("text", None, 'sentiment', {}).flight_key() is not None
+    for bound in [{'timeout': 0.2}, {'deadline': 2}]:
+        request = APIRequest("text", None, 'sentiment', {}, **bound)
+        assert request.coalesce_key() is None
+        assert request.flight_key() is None
+
+
+@patch('indicoio.utils.api.get_session')
+def test_deadline_abandons_remaining_chunks(mock_get_session):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post
+    post.side_effect = slow_post(0.05)
+    data = ['a', 'b', 'a', 'c', 'd']
+
+    with pytest.raises(DeadlineExceededError) as error:
+        sentiment(data, batch_size=1, deadline=0.12)
+    assert error.value.results == ['a', 'b', 'a', None, None]
+    assert post.call_count == 3
+
+    post.reset_mock()
+    with pytest.raises(DeadlineExceededError) as error:
+        sentiment(data, batch_size=1, deadline=0.12, isolate_errors=True)
+    assert error.value.results == ['a', 'b', 'a', None, None]
+
+
+@patch('indicoio.utils.api.get_session')
+def test_deadline_results_merged_with_cache_hits(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.utils.cache import MemoryCache, set_cache
+    post = mock_get_session.return_value.post
+    post.side_effect = slow_post(0.05)
+    set_cache(MemoryCache())
+    try:
+        sentiment(['b', 'd'])
+        with pytest.raises(DeadlineExceededError) as error:
+            sentiment(['a', 'b', 'c', 'd', 'e', 'f'], batch_size=1, deadline=0.12)
+        assert error.value.results == ['a', 'b', 'c', 'd', None, None]
+        sent = post.call_count
+        assert sentiment(['a', 'b', 'c', 'd']) == ['a', 'b', 'c', 'd']
+        assert post.call_count == sent
+    finally:
+        set_cache(None)
+
+
+@patch('indicoio.utils.retry.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_no_retry_past_deadline(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post
+    post.return_value = make_response(503, headers={'Retry-After': '10'})
+
+    with pytest.raises(DeadlineExceededError):
+        sentiment("text", deadline=5)
+    assert post.call_count == 1
+    assert not mock_sleep.called
+
+
+@patch('time.sleep')
+@patch('time.time')
+@patch('indicoio.utils.api.get_session')
+def test_collection_wait_deadline(mock_get_session, mock_time, mock_sleep):
+    from indicoio.custom import Collection
+    clock = [1000.0]
+    mock_time.side_effect = lambda: clock[0]
+    mock_sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+    post = mock_get_session.return_value.post
+    post.return_value = make_response(200, {'test': {'status': 'training'}})
+
+    with pytest.raises(DeadlineExceededError):
+        Collection("test").wait(interval=1, deadline=2.5)
+    assert mock_sleep.call_args_list == [((1,),), ((1,),)]
+    assert post.call_count == 3
+    assert post.call_args[1]['timeout'] == 0.5
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from mock import patch, MagicMock
+
+from indicoio import config
+from indicoio.utils.hedge import HedgePolicy
+from indicoio.utils.stats import STATS
+from indicoio.utils.tests.helpers import make_response
+
+
+def slow_then_fast(delays):
+    calls = []
+    lock = threading.Lock()
+
+    def post(url, data=None, **kwargs):
+        with lock:
+            calls.append(url)
+            delay = delays[len(calls) - 1]
+        time.sleep(delay)
+        return make_response(200, "response after %s" % delay)
+    return post, calls
+
+
+def warm_up(api, latency=0.01, samples=20):
+    STATS.reset()
+    for _ in range(samples):
+        STATS.record(config.PUBLIC_API_HOST, api, 1, 10, latency)
+
+
+@patch('indicoio.utils.api.get_session')
+def test_hedges_slow_request(mock_get_session):
+    from indicoio import sentiment_hq
+    post, calls = slow_then_fast([0.5, 0.0])
+    mock_get_session.return_value.post = MagicMock(side_effect=post)
+    warm_up('sentimenthq')
+    policy = HedgePolicy(max_ratio=1.0)
+
+    assert sentiment_hq("text", hedge=policy) == "response after 0.0"
+    assert len(calls) == 2
+    assert policy.stats() == {'requests': 1, 'hedges': 1, 'wins': 1}
+
+
+@patch('indicoio.utils.api.get_session')
+def test_hedge_rate_is_capped(mock_get_session):
+    from indicoio import sentiment_hq
+    post, calls = slow_then_fast([0.05, 0.05, 0.05, 0.0])
+    mock_get_session.return_value.post = MagicMock(side_effect=post)
+    warm_up('sentimenthq')
+    policy = HedgePolicy(max_ratio=0.5)
+
+    for _ in range(2):
+        assert sentiment_hq("text", hedge=policy) == "response after 0.05"
+    assert policy.stats()['hedges'] == 1
+    assert len(calls) == 3
+
+
+@patch('indicoio.utils.api.get_session')
+def test_no_hedging_without_samples_or_for_custom(mock_get_session):
+    from indicoio import sentiment_hq
+    from indicoio.custom import Collection
+    post, calls = slow_then_fast([0.05, 0.0])
+    mock_get_session.return_value.post = MagicMock(side_effect=post)
+    STATS.reset()
+    policy = HedgePolicy(max_ratio=1.0)
+    sentiment_hq("text", hedge=policy)
+    assert policy.stats()['hedges'] == 0
+
+    warm_up('custom')
+    assert Collection("test").add_data(["text", "label"], hedge=policy) == "response after 0.0"
+    assert policy.stats()['requests'] == 1
+
+
+def test_single_and_batch_latencies_kept_apart():
+    STATS.reset()
+    for _ in range(20):
+        STATS.record('host', 'sentiment', 1, 10, 0.01)
+        STATS.record('host', 'sentiment', 1000, 10000, 5.0, batch=True)
+    policy = HedgePolicy(percentile=95)
+    assert policy.delay('host', 'sentiment') == 0.01
+    assert abs(policy.delay('host', 'sentiment', (0, 100)) - 0.5) < 1e-9
+
+
+@patch('indicoio.utils.api.get_session')
+def test_batches_hedged_only_when_enabled(mock_get_session):
+    from indicoio import sentiment_hq
+    post, calls = slow_then_fast([0.05, 0.05, 0.0])
+    mock_get_session.return_value.post = MagicMock(side_effect=post)
+    STATS.reset()
+    for _ in range(20):
+        STATS.record(config.PUBLIC_API_HOST, 'sentimenthq', 2, 10, 0.002, batch=True)
+
+    policy = HedgePolicy(max_ratio=1.0)
+    assert sentiment_hq(["a", "b"], hedge=policy) == "response after 0.05"
+    assert policy.stats()['requests'] == 0
+
+    STATS.reset()
+    for _ in range(20):
+        STATS.record(config.PUBLIC_API_HOST, 'sentimenthq', 2, 10, 0.002, batch=True)
+    policy = HedgePolicy(max_ratio=1.0, batches=True)
+    assert sentiment_hq(["a", "b"], hedge=policy) == "response after 0.0"
+    assert policy.stats() == {'requests': 1, 'hedges': 1, 'wins': 1}
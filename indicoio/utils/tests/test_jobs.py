@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+
+from indicoio.utils.errors import IndicoError
+from indicoio.utils.jobs import Job
+
+
+class FlakyAPI(object):
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.calls = []
+
+    def __call__(self, data, **kwargs):
+        if self.fail_at in data:
+            raise RuntimeError("worker died")
+        self.calls.append(list(data))
+        return [x * 10 for x in data]
+
+
+class TestJob(object):
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def test_resume_after_failure(self):
+        data = list(range(50))
+        api = FlakyAPI(fail_at=35)
+        job = Job(api, data, "test", directory=self.directory, chunk_size=5, concurrency=1)
+        try:
+            job.run()
+        except RuntimeError:
+            pass
+        assert job.progress()["done"] == 35
+
+        api = FlakyAPI()
+        job = Job(api, data, "test", directory=self.directory, chunk_size=5, concurrency=3)
+        assert job.progress()["done"] == 35
+        assert job.run() == [x * 10 for x in data]
+        assert sorted(x for call in api.calls for x in call) == list(range(35, 50))
+
+        api = FlakyAPI()
+        assert Job(api, data, "test", directory=self.directory, chunk_size=5).run() == [x * 10 for x in data]
+        assert api.calls == []
+
+    def test_progress_callback(self):
+        updates = []
+        job = Job(FlakyAPI(), range(20), "progress", directory=self.directory,
+                  chunk_size=5, callback=updates.append)
+        job.run()
+        assert [update["done"] for update in updates] == [5, 10, 15, 20]
+        assert updates[-1]["total"] == 20
+        assert updates[-1]["eta"] == 0
+
+    def test_torn_journal_line(self):
+        job = Job(FlakyAPI(), list(range(10)), "torn", directory=self.directory, chunk_size=5)
+        job.run()
+        with open(job.path, "ab") as journal:
+            journal.write(b'{"start": 10, "sto')
+
+        job = Job(FlakyAPI(), list(range(15)), "torn", directory=self.directory, chunk_size=5)
+        assert job.run() == [x * 10 for x in range(15)]
+
+    def test_changed_inputs_rerun(self):
+        Job(FlakyAPI(), list(range(15)), "changed", directory=self.directory, chunk_size=5).run()
+
+        api = FlakyAPI()
+        data = [0, 1, 2, 3, 4, 50, 6, 7, 8, 9]
+        job = Job(api, data, "changed", directory=self.directory, chunk_size=5)
+        assert job.run() == [x * 10 for x in data]
+        assert api.calls == [[50, 6, 7, 8, 9]]
+        assert job.progress()["done"] == 10
+
+        api = FlakyAPI()
+        assert Job(api, data, "changed", directory=self.directory, chunk_size=5).run() == [x * 10 for x in data]
+        assert api.calls == []
+
+    def test_torn_journal_header(self):
+        job = Job(FlakyAPI(), list(range(5)), "header", directory=self.directory, chunk_size=5)
+        for torn in [b"", b'{"job_id": "hea']:
+            with open(job.path, "wb") as journal:
+                journal.write(torn)
+            job = Job(FlakyAPI(), list(range(5)), "header", directory=self.directory, chunk_size=5)
+            assert job.progress()["done"] == 0
+            assert job.run() == [x * 10 for x in range(5)]
+
+    def test_errors_round_trip(self):
+        api = lambda data: [IndicoError("bad input")] + data[1:]
+        job = Job(api, ["a", "b"], "errors", directory=self.directory)
+        results = job.run()
+        assert isinstance(results[0], IndicoError)
+        assert results[1] == "b"
+
+    def test_chunk_size_mismatch(self):
+        Job(FlakyAPI(), [1], "mismatch", directory=self.directory, chunk_size=5).run()
+        try:
+            Job(FlakyAPI(), [1], "mismatch", directory=self.directory, chunk_size=6)
+        except IndicoError:
+            pass
+        else:
+            assert False, "expected IndicoError"
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+from mock import patch, MagicMock
+
+from indicoio.utils.ratelimit import (
+    TokenBucket, FileTokenBucket, RateLimiter, set_rate_limiter, get_rate_limiter
+)
+from indicoio.utils.breaker import set_circuit_breaker
+from indicoio.utils.errors import CircuitOpenError, DeadlineExceededError
+from indicoio.utils.tests.helpers import echo_response
+
+
+@patch('indicoio.utils.ratelimit.time.time', return_value=1000.0)
+def test_token_bucket_spaces_requests(_):
+    bucket = TokenBucket(rate=10, capacity=2)
+    delays = [bucket.reserve() for _ in range(5)]
+    assert delays == pytest.approx([0, 0, 0.1, 0.2, 0.3])
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="file locks require fcntl")
+@patch('indicoio.utils.ratelimit.time.time', return_value=1000.0)
+def test_file_token_bucket_is_shared(_):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "shared.bucket")
+        first, second = FileTokenBucket(10, 1, path), FileTokenBucket(10, 1, path)
+        assert first.reserve() == 0
+        assert second.reserve() == pytest.approx(0.1)
+        assert first.reserve(5) == pytest.approx(0.6)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_limiter_scopes():
+    limiter = RateLimiter(requests_per_second=1, items_per_second=100)
+    assert limiter.reserve('host', 'key', 10) == 0
+    assert limiter.reserve('host', 'key', 10) > 0.9
+    assert limiter.reserve('host', 'other key', 10) == 0
+    assert limiter.reserve('other host', 'key', 150) == pytest.approx(0.5, abs=0.01)
+
+    set_rate_limiter(limiter, cloud='private')
+    try:
+        assert get_rate_limiter('private') is limiter
+        assert get_rate_limiter(None) is None
+    finally:
+        set_rate_limiter(None, cloud='private')
+
+
+@patch('indicoio.utils.api.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_api_handler_paces_chunks(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    set_rate_limiter(RateLimiter(items_per_second=10, burst=0.5))
+    try:
+        data = ["text %d" % i for i in range(15)]
+        assert sentiment(data, batch_size=5) == data
+    finally:
+        set_rate_limiter(None)
+
+    delays = [call[0][0] for call in mock_sleep.call_args_list]
+    assert len(delays) == 2
+    assert delays[0] == pytest.approx(0.5, abs=0.05)
+    assert delays[1] == pytest.approx(1.0, abs=0.05)
+
+
+def test_limiter_release():
+    limiter = RateLimiter(requests_per_second=1, items_per_second=10)
+    assert limiter.reserve('host', 'key', 10) == 0
+    delay = limiter.reserve('host', 'key', 10)
+    assert delay > 0.9
+    limiter.release('host', 'key', 10, delay)
+    assert limiter.waited == pytest.approx(0)
+    assert limiter.reserve('host', 'key', 10) == pytest.approx(delay, abs=0.01)
+
+
+@patch('indicoio.utils.api.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_unsent_requests_spend_no_quota(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=echo_response)
+    limiter = RateLimiter(requests_per_second=1, items_per_second=10)
+    breaker = MagicMock()
+    breaker.before.side_effect = CircuitOpenError("Circuit open", retry_after=1)
+    set_rate_limiter(limiter)
+    set_circuit_breaker(breaker)
+    try:
+        with pytest.raises(CircuitOpenError):
+            sentiment(["text"] * 10, retry=False)
+        set_circuit_breaker(None)
+        with pytest.raises(DeadlineExceededError):
+            sentiment(["text"] * 10, deadline=0)
+        assert sentiment(["text"] * 10) == ["text"] * 10
+        with pytest.raises(DeadlineExceededError):
+            sentiment(["text"] * 10, deadline=0.5)
+        assert limiter.waited == pytest.approx(0)
+    finally:
+        set_rate_limiter(None)
+        set_circuit_breaker(None)
+    assert not mock_sleep.called
+    assert mock_get_session.return_value.post.call_count == 1
@@ -0,0 +1,76 @@
+import gzip
+import time
+
+import pytest
+import requests
+
+from indicoio.utils.errors import IndicoError
+from indicoio.utils.recording import RecordingTransport, ReplayTransport, load, redact
+from indicoio.utils.standin import StandInServer
+from indicoio.utils.transport import set_transport
+
+
+def record(path, transport, calls):
+    recorder = RecordingTransport(path, transport)
+    previous = set_transport(recorder)
+    try:
+        return [call() for call in calls]
+    finally:
+        set_transport(previous)
+        recorder.close()
+
+
+def test_redact():
+    assert redact("https://host/sentiment?key=secret&version=2") == \
+        "https://host/sentiment?key=REDACTED&version=2"
+
+
+def test_record_and_replay(tmpdir):
+    from indicoio import sentiment, keywords, people
+    path = str(tmpdir.join("traffic.jsonl.gz"))
+    calls = [
+        lambda: sentiment("text", api_key="secret"),
+        lambda: keywords(["a b", "c d"], api_key="secret"),
+    ]
+    results = record(path, StandInServer(latency=0.02), calls)
+
+    exchanges = load(path)
+    assert [exchange['status'] for exchange in exchanges] == [200, 200]
+    assert all("secret" not in exchange['url'] for exchange in exchanges)
+    assert exchanges[0]['latency'] >= 0.02
+    with gzip.open(path, 'rb') as recording:
+        assert b"secret" not in recording.read()
+
+    replay = ReplayTransport(path, time_scale=0)
+    previous = set_transport(replay)
+    try:
+        started = time.time()
+        assert [call() for call in calls] == results
+        assert time.time() - started < 0.02
+        assert sentiment("other text") == results[0]
+        assert replay.misses == 0
+        with pytest.raises(IndicoError):
+            people("text")
+        assert replay.misses == 1
+    finally:
+        set_transport(previous)
+
+
+def test_replays_failures_and_timing(tmpdir):
+    from indicoio import sentiment
+    path = str(tmpdir.join("traffic.jsonl.gz"))
+    with pytest.raises(requests.Timeout):
+        record(path, StandInServer(latency=0.05), [
+            lambda: sentiment("text"),
+            lambda: sentiment("slow", timeout=0.01, retry=False),
+        ])
+
+    previous = set_transport(ReplayTransport(path, time_scale=2))
+    try:
+        started = time.time()
+        sentiment("text")
+        assert time.time() - started >= 0.1
+        with pytest.raises(requests.Timeout):
+            sentiment("slow", retry=False)
+    finally:
+        set_transport(previous)
@@ -0,0 +1,79 @@
+import json
+
+import requests
+from mock import patch, MagicMock
+
+from indicoio.utils.api import parse_retry_after
+from indicoio.utils.errors import IndicoError, RetryableError
+from indicoio.utils.retry import RetryPolicy
+from indicoio.utils.tests.helpers import make_response
+
+
+def test_backoff_bounds():
+    policy = RetryPolicy(max_attempts=5, backoff=1, max_backoff=3)
+    for attempt in range(1, 5):
+        assert 0 <= policy.next_delay(attempt) <= min(3, 2 ** (attempt - 1))
+    assert policy.next_delay(5) is None
+    assert policy.next_delay(1, RetryableError("", retry_after=10)) == 10
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+
+
+@patch('indicoio.utils.retry.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_retries_transient_failures(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    mock_get_session.return_value.post = MagicMock(side_effect=[
+        make_response(429, headers={'Retry-After': '1'}),
+        requests.ConnectionError(),
+        make_response(200, results=0.5),
+    ])
+    assert sentiment("text") == 0.5
+    assert mock_sleep.call_count == 2
+    assert mock_sleep.call_args_list[0][0][0] >= 1
+
+
+@patch('indicoio.utils.retry.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_retries_per_chunk(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    responses = [
+        make_response(200, results=[1, 2]),
+        make_response(502),
+        make_response(200, results=[3, 4]),
+    ]
+    post = mock_get_session.return_value.post = MagicMock(side_effect=responses)
+    assert sentiment([1, 2, 3, 4], batch_size=2) == [1, 2, 3, 4]
+    assert json.loads(post.call_args[1]['data'])['data'] == [3, 4]
+
+
+@patch('indicoio.utils.retry.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_private_cloud_503_not_retried(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post = MagicMock(return_value=make_response(503))
+    try:
+        sentiment("text", cloud="test")
+    except RetryableError:
+        assert False, "private cloud 503 must not be retried"
+    except IndicoError:
+        pass
+    assert post.call_count == 1
+
+
+@patch('indicoio.utils.retry.time.sleep')
+@patch('indicoio.utils.api.get_session')
+def test_gives_up_after_max_attempts(mock_get_session, mock_sleep):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post = MagicMock(return_value=make_response(500))
+    try:
+        sentiment("text", retry=RetryPolicy(max_attempts=4))
+    except RetryableError as e:
+        assert e.status_code == 500
+    else:
+        assert False, "expected RetryableError"
+    assert post.call_count == 4
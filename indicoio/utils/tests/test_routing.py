@@ -0,0 +1,95 @@
+import json
+from collections import Counter
+
+import pytest
+import requests
+from mock import patch
+
+from indicoio import config
+from indicoio.utils.errors import IndicoError
+from indicoio.utils.routing import EndpointPool, set_endpoints
+from indicoio.utils.stats import STATS
+from indicoio.utils.tests.helpers import make_response
+
+
+def test_parse_endpoints():
+    assert config.parse_endpoints("east=3, west=1,public=0") == [
+        ("east", 3.0), ("west", 1.0), ("public", 0.0)
+    ]
+    assert config.parse_endpoints("east") == [("east", 1.0)]
+    assert config.parse_endpoints("") == []
+
+
+@patch('indicoio.utils.routing.random.uniform')
+def test_candidates_by_weight_then_standby(mock_uniform):
+    pool = EndpointPool([("east", 3), ("west", 1), ("public", 0)])
+    mock_uniform.side_effect = lambda low, high: high
+    assert [e.name for e in pool.candidates('sentiment')] == ["west", "east", "public"]
+    mock_uniform.side_effect = lambda low, high: low
+    assert [e.name for e in pool.candidates('sentiment')] == ["east", "west", "public"]
+    assert pool.candidates('sentiment')[2].host == config.PUBLIC_API_HOST
+
+
+def test_weights_follow_latency_and_health():
+    pool = EndpointPool([("east", 1), ("west", 1)], max_failures=2)
+    east, west = pool.endpoints
+    pool.observe(east.host, 'sentiment', 10, 100, 1.0)
+    pool.observe(west.host, 'sentiment', 10, 100, 4.0)
+    assert pool.effective_weight(east, 'sentiment') == 1.0
+    assert pool.effective_weight(west, 'sentiment') == 0.25
+    assert pool.effective_weight(west, 'language') == 1.0
+
+    pool.observe(east.host, 'sentiment', 10, 100, 1.0, error=requests.ConnectionError())
+    pool.observe(east.host, 'sentiment', 10, 100, 1.0, error=IndicoError("bad input"))
+    pool.observe(east.host, 'sentiment', 10, 100, 1.0, error=requests.Timeout())
+    assert not pool.is_down(east)
+    pool.observe(east.host, 'sentiment', 10, 100, 1.0, error=requests.Timeout())
+    assert pool.is_down(east)
+    assert pool.candidates('sentiment') == [west]
+    assert pool.states()['east']['down']
+
+
+@patch('indicoio.utils.api.get_session')
+def test_fails_over_to_next_endpoint(mock_get_session):
+    from indicoio import sentiment
+    post = mock_get_session.return_value.post
+    post.side_effect = lambda url, **kwargs: (
+        make_response(502) if url.startswith("https://east.") else make_response(200, [0.5, 0.9])
+    )
+    STATS.reset()
+    set_endpoints("east=1,west=0", max_failures=1)
+    try:
+        assert sentiment(["good", "bad"], retry=False) == [0.5, 0.9]
+        hosts = [call[0][0].split("/")[2] for call in post.call_args_list]
+        assert hosts == ["east.indico.domains", "west.indico.domains"]
+
+        post.reset_mock()
+        sentiment(["good", "bad"], retry=False)
+        assert Counter(call[0][0].split("/")[2] for call in post.call_args_list) == {
+            "west.indico.domains": 1
+        }
+    finally:
+        set_endpoints(None)
+
+
+@patch('indicoio.utils.api.get_session')
+def test_input_errors_and_custom_are_not_routed(mock_get_session):
+    from indicoio import sentiment
+    from indicoio.custom import Collection
+    post = mock_get_session.return_value.post
+    post.return_value = make_response(400)
+    post.return_value.content = json.dumps({'error': 'bad input'}).encode('utf-8')
+    set_endpoints([("east", 1), ("west", 1)])
+    try:
+        with pytest.raises(IndicoError):
+            sentiment("text")
+        assert post.call_count == 1
+
+        post.return_value = make_response(200, "ok")
+        Collection("test").add_data(["text", "label"])
+        assert post.call_args[0][0].startswith("https://%s/" % config.PUBLIC_API_HOST)
+
+        Collection("test").predict("text", cloud="west")
+        assert post.call_args[0][0].startswith("https://west.indico.domains/")
+    finally:
+        set_endpoints(None)
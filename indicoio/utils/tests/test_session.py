@@ -0,0 +1,37 @@
+import os
+from mock import patch
+
+from indicoio.utils.session import SessionPool
+
+
+def test_session_reused_per_host():
+    pool = SessionPool()
+    assert pool.get('apiv2.indico.io') is pool.get('apiv2.indico.io')
+    assert pool.get('apiv2.indico.io') is not pool.get('test.indico.domains')
+    pool.close()
+
+
+def test_pool_size_per_host():
+    pool = SessionPool(pool_size=4)
+    pool.configure(16, host='test.indico.domains')
+    assert pool.get_pool_size('apiv2.indico.io') == 4
+    assert pool.get_pool_size('test.indico.domains') == 16
+
+    adapter = pool.get('test.indico.domains').get_adapter('https://test.indico.domains')
+    assert adapter._pool_maxsize == 16
+    pool.close()
+
+
+def test_configure_rebuilds_session():
+    pool = SessionPool()
+    session = pool.get('apiv2.indico.io')
+    pool.configure(2)
+    assert pool.get('apiv2.indico.io') is not session
+    pool.close()
+
+
+def test_sessions_recreated_after_fork():
+    pool = SessionPool()
+    session = pool.get('apiv2.indico.io')
+    with patch('indicoio.utils.session.os.getpid', return_value=os.getpid() + 1):
+        assert pool.get('apiv2.indico.io') is not session
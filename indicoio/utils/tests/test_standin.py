@@ -0,0 +1,64 @@
+import pytest
+import requests
+
+from indicoio import config
+from indicoio.utils.errors import IndicoError, RetryableError
+from indicoio.utils.standin import StandInServer
+from indicoio.utils.transport import set_transport
+
+
+@pytest.fixture
+def standin():
+    server = StandInServer()
+    previous = set_transport(server)
+    yield server
+    set_transport(previous)
+
+
+def test_fake_results_follow_url_scheme(standin):
+    from indicoio import sentiment, keywords, fer, analyze_text
+    from indicoio.custom import Collection
+
+    score = sentiment("text")
+    assert 0 <= score <= 1 and sentiment("text") == score
+    assert sentiment(["text", "other"])[0] == score
+    assert sorted(keywords("b a c", top_n=2)) == ["a", "b"]
+    assert len(fer("aGVsbG8=")) == 6
+    assert sorted(analyze_text(["a", "b"], apis=["sentiment", "text_tags"])) == ["sentiment", "text_tags"]
+
+    collection = Collection("test")
+    collection.add_data(["text", "label"])
+    collection.wait()
+    assert collection.info()['number_of_samples'] == 1
+    assert standin.requests == 9 and standin.items == 11
+
+
+def test_limits_and_errors(standin):
+    from indicoio import sentiment
+    standin.max_items = 2
+    with pytest.raises(IndicoError):
+        sentiment(["a", "b", "c"], batch_size=3)
+    assert len(sentiment(["a", "b", "c"], batch_size=2)) == 3
+
+    standin.error_rate = 1.0
+    with pytest.raises(RetryableError):
+        sentiment("text", retry=False)
+    assert standin.errors == 2
+
+    standin.error_rate, standin.latency = 0.0, 0.05
+    with pytest.raises(requests.Timeout):
+        sentiment("text", timeout=0.01, retry=False)
+
+
+def test_serves_http():
+    from indicoio import sentiment
+    server = StandInServer()
+    host, protocol = config.PUBLIC_API_HOST, config.url_protocol
+    config.PUBLIC_API_HOST, config.url_protocol = server.serve(), "http:"
+    try:
+        data = ["text %d" % i for i in range(5)]
+        assert sentiment(data, batch_size=2) == sentiment(data, batch_size=2, stream_body=True)
+        assert server.requests == 6
+    finally:
+        server.shutdown()
+        config.PUBLIC_API_HOST, config.url_protocol = host, protocol
@@ -0,0 +1,46 @@
+import random
+import time
+
+from mock import patch
+
+from indicoio.utils.stream import imap
+
+
+def slow_double(data, **kwargs):
+    time.sleep(random.random() / 50)
+    return [x * kwargs.get('factor', 2) for x in data]
+
+
+def test_imap_ordered():
+    results = imap(slow_double, iter(range(1000)), chunk_size=7, concurrency=5)
+    assert list(results) == [x * 2 for x in range(1000)]
+
+
+def test_imap_unordered():
+    results = imap(slow_double, range(100), chunk_size=3, concurrency=5, ordered=False, factor=3)
+    assert sorted(results) == [(x, x * 3) for x in range(100)]
+
+
+def test_imap_pulls_lazily():
+    pulled = []
+
+    def source():
+        for x in range(10000):
+            pulled.append(x)
+            yield x
+
+    results = imap(slow_double, source(), chunk_size=10, concurrency=2)
+    assert [next(results) for _ in range(5)] == [0, 2, 4, 6, 8]
+    assert len(pulled) <= 40
+    results.close()
+
+
+def test_imap_by_name():
+    with patch('indicoio.sentiment', side_effect=slow_double):
+        assert list(imap('sentiment', range(5), chunk_size=2)) == [0, 2, 4, 6, 8]
+
+
+def test_imap_without_concurrency_sends_one_chunk_at_a_time():
+    for concurrency in [0, -1]:
+        results = imap(slow_double, range(10), chunk_size=3, concurrency=concurrency)
+        assert list(results) == [x * 2 for x in range(10)]
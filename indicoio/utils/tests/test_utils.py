@@ -1,3 +1,4 @@
+import json
 import sys
 
 from mock import patch, MagicMock
@@ -9,7 +10,7 @@ mock_response.headers = {
     'x-warning': 'testing warning'
 }
 mock_response.status_code = 200
-mock_response.json = MagicMock(return_value={'results': 0.5})
+mock_response.content = json.dumps({'results': 0.5}).encode('utf-8')
 
 def test_is_urls():
     boring_image = [0]*(32**2)
@@ -24,9 +25,12 @@ def test_is_urls():
     assert is_url(url, batch=False)
     assert is_url(urls, batch=True)
 
+mock_session = MagicMock()
+mock_session.post = MagicMock(return_value=mock_response)
+
 @patch('indicoio.utils.api.warnings.warn')
-@patch('indicoio.utils.api.requests.post', MagicMock(return_value=mock_response))
+@patch('indicoio.utils.api.get_session', MagicMock(return_value=mock_session))
 def test_api_handler(mock_warn):
     from indicoio.utils.api import api_handler
     api_handler("test", cloud=None, api='sentiment')
-    assert mock_warn.called_with(mock_response.headers.get('x-warning'))
+    mock_warn.assert_called_with(mock_response.headers.get('x-warning'))
@@ -0,0 +1,107 @@
+"""
+Pluggable transports, sending the HTTP requests built by `indicoio.utils.api`
+"""
+import zlib
+
+from six.moves.urllib.parse import urlparse, parse_qs
+
+from indicoio.utils.session import get_session
+
+
+class Transport(object):
+    """
+    Sends requests in place of the pooled `requests` sessions, for instance
+    to a local stand-in server (`indicoio.utils.standin.StandInServer`) or
+    a recording. Set one with `set_transport`.
+
+    `post` receives the full request url, the body (bytes, or an iterable
+    of bytes for streamed bodies), the headers and the timeout in seconds
+    (or None), and returns a response with `status_code`, `headers`,
+    `content`, `iter_content(chunk_size)` and `close()`, such as
+    `Response`. It should raise `requests.Timeout` or
+    `requests.ConnectionError` on transport failures, as `requests` does.
+
+    `indicoio.aio` awaits `post_async` with the same arguments when a
+    transport defines it, and otherwise runs `post` in a thread.
+    """
+
+    def post(self, url, data, headers, timeout=None, stream=False):
+        raise NotImplementedError
+
+
+class HTTPTransport(Transport):
+    """
+    Sends requests over HTTP through the pooled sessions of
+    `indicoio.utils.session`, as the client does when no transport is set
+    """
+
+    def post(self, url, data, headers, timeout=None, stream=False):
+        return get_session(urlparse(url).netloc).post(
+            url, data=data, headers=headers, verify=False, timeout=timeout, stream=stream
+        )
+
+
+class Response(object):
+    """
+    A complete HTTP response, returned by transports
+    """
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+def body_bytes(data):
+    """
+    Request body `data` as bytes, joining the pieces of streamed bodies
+    """
+    if data is None or isinstance(data, bytes):
+        return data or b""
+    return b"".join(data)
+
+
+def decoded_body(data, headers):
+    """
+    Request body `data` as uncompressed bytes
+    """
+    body = body_bytes(data)
+    if (headers or {}).get('Content-Encoding') == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    return body
+
+
+def parse_url(url):
+    """
+    The api, batch flag, method and query parameters of a url built by
+    `indicoio.utils.api.create_url`
+    """
+    parsed = urlparse(url)
+    query = dict((key, values[0]) for key, values in parse_qs(parsed.query).items())
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    split = 2 if segments[:1] == ['apis'] else 1
+    api, rest = '/'.join(segments[:split]), segments[split:]
+    batch = rest[:1] == ['batch']
+    method = (rest[1:] if batch else rest)[:1]
+    return api, batch, method[0] if method else None, query
+
+
+TRANSPORT = None
+
+
+def set_transport(transport):
+    """
+    Send every request through `transport`, a `Transport`, or pass None to
+    use HTTP again. Returns the previous transport.
+    """
+    global TRANSPORT
+    previous = TRANSPORT
+    TRANSPORT = transport
+    return previous
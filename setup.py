@@ -16,6 +16,7 @@ setup(
         "indicoio.images",
         "indicoio.utils",
         "indicoio.custom",
+        "indicoio.aio",
         "tests",
     ],
     description="""
@@ -55,6 +56,11 @@ setup(
         "requests >= 1.2.3",
         "six >= 1.3.0",
         "pillow >= 2.8.1",
-        "mock >= 1.3.0"
-    ]
+        "mock >= 1.3.0",
+        "futures >= 3.0.0; python_version < '3'"
+    ],
+    extras_require={
+        "aio": ["aiohttp >= 3.0"],
+        "fast": ["orjson"]
+    }
 )
@@ -0,0 +1,208 @@
+import asyncio
+import unittest
+
+try:
+    from aiohttp import web
+    from indicoio import aio
+except ImportError:
+    aio = None
+
+from indicoio import config
+from indicoio.utils.errors import IndicoError, DeadlineExceededError
+
+
+async def echo(request):
+    body = await request.json()
+    if body['data'] == 'fail' or 'fail' in body['data']:
+        return web.json_response({'error': 'failed'})
+    if request.match_info['api'] == 'apis':
+        apis = request.query['apis'].split(',')
+        return web.json_response({'results': dict(
+            (api, {'results': body['data']}) for api in apis
+        )})
+    return web.json_response({'results': body['data']})
+
+
+async def collections(request):
+    return web.json_response({'results': {'test': {'status': 'ready'}}})
+
+
+@unittest.skipIf(aio is None, "aiohttp is not installed")
+class AsyncAPITest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.host, self.protocol = config.PUBLIC_API_HOST, config.url_protocol
+        app = web.Application()
+        app.router.add_post('/custom/collections', collections)
+        app.router.add_post('/{api}/{tail:.*}', echo)
+        app.router.add_post('/{api}', echo)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        port = site._server.sockets[0].getsockname()[1]
+        config.PUBLIC_API_HOST = '127.0.0.1:%d' % port
+        config.url_protocol = 'http:'
+
+    def tearDown(self):
+        self.loop.run_until_complete(aio.close())
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+        config.PUBLIC_API_HOST, config.url_protocol = self.host, self.protocol
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_single(self):
+        self.assertEqual(self.run_async(aio.sentiment('text')), 'text')
+
+    def test_chunked_batch(self):
+        data = ['text %d' % i for i in range(25)]
+        result = self.run_async(aio.keywords(data, batch_size=4, max_workers=3))
+        self.assertEqual(result, data)
+
+    def test_many_concurrent_calls(self):
+        data = ['text %d' % i for i in range(200)]
+
+        async def run():
+            return await asyncio.gather(*[aio.language(text) for text in data])
+
+        result = self.run_async(run())
+        self.assertEqual(result, data)
+
+    def test_streamed_body(self):
+        data = ['text %d' % i for i in range(10)]
+        previous = config.gzip_min_bytes
+        for min_bytes in (None, 1):
+            config.gzip_min_bytes = min_bytes
+            try:
+                result = self.run_async(aio.keywords(data, batch_size=4, stream_body=True))
+            finally:
+                config.gzip_min_bytes = previous
+            self.assertEqual(result, data)
+
+    def test_hedged(self):
+        from indicoio.utils.hedge import HedgePolicy
+        from indicoio.utils.stats import STATS
+        for _ in range(20):
+            STATS.record(config.PUBLIC_API_HOST, 'fer', 2, 10, 0.0, batch=True)
+        data = ['text %d' % i for i in range(4)]
+        policy = HedgePolicy(percentile=0, max_ratio=1.0)
+        self.run_async(aio.fer(data, batch=True, hedge=policy, batch_size=2))
+        self.assertEqual(policy.stats()['requests'], 0)
+
+        policy = HedgePolicy(percentile=0, max_ratio=1.0, batches=True)
+        result = self.run_async(aio.fer(data, batch=True, hedge=policy, batch_size=2))
+        self.assertEqual(result, data)
+        self.assertEqual(policy.stats()['requests'], 2)
+
+    def test_deadline(self):
+        data = ['text %d' % i for i in range(4)]
+        self.assertEqual(self.run_async(aio.keywords(data, timeout=5, deadline=5)), data)
+        with self.assertRaises(DeadlineExceededError) as error:
+            self.run_async(aio.keywords(data, batch_size=2, deadline=0))
+        self.assertEqual(error.exception.results, [None] * 4)
+        with self.assertRaises(DeadlineExceededError):
+            self.run_async(aio.Collection('test').wait(deadline=0))
+
+    def test_transport(self):
+        from indicoio.utils.standin import StandInServer
+        from indicoio.utils.transport import set_transport
+        from indicoio import keywords
+        standin = StandInServer()
+        previous = set_transport(standin)
+        try:
+            data = ['text %d' % i for i in range(4)]
+            result = self.run_async(aio.keywords(data, batch_size=2, max_workers=2))
+            self.assertEqual(result, keywords(data))
+            self.assertEqual(standin.requests, 3)
+        finally:
+            set_transport(previous)
+
+    def test_cancelled_trial(self):
+        import time
+        from indicoio.utils.breaker import CircuitBreaker, set_circuit_breaker
+        from indicoio.utils.errors import CircuitOpenError, RetryableError
+        from indicoio.utils.standin import StandInServer
+        from indicoio.utils.transport import set_transport
+        breaker = CircuitBreaker(min_requests=1, reset_timeout=0.2)
+        breaker.observe(config.PUBLIC_API_HOST, 'sentiment', 1, 10, 0.1, RetryableError("busy", 503))
+        previous = set_transport(StandInServer(latency=0.5))
+        set_circuit_breaker(breaker)
+        try:
+            time.sleep(0.2)
+            with self.assertRaises(asyncio.TimeoutError):
+                self.run_async(asyncio.wait_for(aio.sentiment('a', retry=False), 0.05))
+            with self.assertRaises(CircuitOpenError):
+                self.run_async(aio.sentiment('b', retry=False))
+            time.sleep(0.2)
+            set_transport(StandInServer())
+            self.run_async(aio.sentiment('c', retry=False))
+            self.assertEqual(list(breaker.states().values())[0]['state'], 'closed')
+        finally:
+            set_circuit_breaker(None)
+            set_transport(previous)
+
+    def test_cache(self):
+        from indicoio import sentiment
+        from indicoio.utils.cache import MemoryCache, set_cache
+        from indicoio.utils.standin import StandInServer
+        from indicoio.utils.transport import set_transport
+        standin = StandInServer()
+        previous = set_transport(standin)
+        cache = MemoryCache()
+        set_cache(cache)
+        try:
+            self.run_async(aio.sentiment(['a', 'b']))
+            result = self.run_async(aio.sentiment(['b', 'c', 'a']))
+            self.assertEqual(standin.requests, 2)
+            self.assertEqual(standin.items, 3)
+            self.assertEqual(result, sentiment(['b', 'c', 'a']))
+            self.assertEqual(standin.requests, 2)
+            self.assertEqual(cache.stats()['hits'], 5)
+        finally:
+            set_cache(None)
+            set_transport(previous)
+
+    def test_multiapi_post_processing(self):
+        result = self.run_async(aio.analyze_text(['a', 'b'], apis=['sentiment', 'language']))
+        self.assertEqual(result, {'sentiment': ['a', 'b'], 'language': ['a', 'b']})
+
+    def test_error(self):
+        with self.assertRaises(IndicoError):
+            self.run_async(aio.sentiment('fail'))
+
+    def test_isolate_errors(self):
+        data = ['a', 'b', 'fail', 'c']
+        result = self.run_async(aio.sentiment(data, isolate_errors=True))
+        self.assertEqual([idx for idx, _ in result.errors], [2])
+        self.assertEqual(result[3], 'c')
+        self.assertEqual(result.extra_requests, 4)
+
+    def test_isolate_errors_raises_request_wide_errors(self):
+        from indicoio.utils.errors import RetryableError, RequestError
+        from indicoio.utils.standin import StandInServer
+        from indicoio.utils.transport import set_transport
+        standin = StandInServer(error_rate=1.0, error_status=503)
+        previous = set_transport(standin)
+        try:
+            with self.assertRaises(RetryableError):
+                self.run_async(aio.sentiment(['a', 'b', 'c', 'd'], isolate_errors=True, retry=False))
+            self.assertEqual(standin.requests, 1)
+            standin.error_status = 401
+            with self.assertRaises(RequestError):
+                self.run_async(aio.sentiment(['a', 'b', 'c', 'd'], isolate_errors=True))
+            self.assertEqual(standin.requests, 2)
+        finally:
+            set_transport(previous)
+
+    def test_collection(self):
+        collection = aio.Collection('test')
+        self.assertEqual(self.run_async(collection.info()), {'status': 'ready'})
+        self.run_async(collection.wait())
+        self.assertEqual(self.run_async(collection.predict(['a', 'b'])), ['a', 'b'])
+
+
+if __name__ == "__main__":
+    unittest.main()